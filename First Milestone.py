@@ -1,14 +1,126 @@
-from flask import Flask, render_template_string, request, redirect, url_for, session, flash
-from collections import defaultdict, Counter
-from datetime import datetime
-import os, uuid
+from flask import Flask, request, redirect, url_for, session, flash, stream_with_context, jsonify, g, abort, send_file
+from collections import Counter
+from datetime import date, timedelta
+import hashlib, math, os, re, secrets, tempfile, threading, time
+from storage import open_store
+from scheduler import Scheduler
+from search import SearchIndex
+from dedupe import Dedupe
+from analytics import Analytics
+from sessions import ServerSessionInterface, Users, open_kv
+import importer, exporter
+from review_state import ReviewStates
+from eventlog import EventLog
+from metrics import Registry, TimedStore, SlowRequestProfiler, SIZE_BUCKETS
+from cache import LRUCache
+from jobs import JobRunner, Busy, Cancelled, DONE
+from assets import Assets, CODINGS, COMPRESSIBLE, IMMUTABLE, choose_coding, encode, gzip_stream, tagged
 
-app = Flask(__name__)
+# Static files are served by asset() below, under content-hashed names.
+app = Flask(__name__, static_folder=None)
 app.secret_key = os.environ.get("SECRET_KEY", "dev-key")
 
-USERS = {}
-DECKS = defaultdict(list)
-STATS = defaultdict(lambda: {"today": Counter(), "by_deck": Counter(), "streak": 0, "last_day": None})
+# FLIPDECK_DB=path/to/flipdeck.db for SQLite; unset keeps everything in memory.
+# Review events go next to the database unless FLIPDECK_EVENTS names a directory.
+DB = os.environ.get("FLIPDECK_DB")
+EVENTS_DIR = os.environ.get("FLIPDECK_EVENTS") or (DB + ".events" if DB else None)
+EVENTS_RETAIN_DAYS = int(os.environ.get("FLIPDECK_EVENTS_RETAIN_DAYS", 90))
+COMPACT_EVERY = 3600
+# Rendered deck, deck list and stats pages kept per process (entries, then bytes).
+RENDER_CACHE_ITEMS = int(os.environ.get("FLIPDECK_RENDER_CACHE_ITEMS", 2048))
+RENDER_CACHE_BYTES = int(os.environ.get("FLIPDECK_RENDER_CACHE_MB", 64)) * 1024 * 1024
+DUE_COUNT_TTL = 60      # seconds a cached deck list may show old due counts
+JOB_WORKERS = int(os.environ.get("FLIPDECK_JOB_WORKERS", 2))
+# Sessions and review states are kept server-side, shared by all workers: FLIPDECK_SESSIONS is "memory",
+# "file:<directory>" or a SQLite path, by default a file next to the database.
+SESSIONS = os.environ.get("FLIPDECK_SESSIONS") or (DB + ".sessions" if DB else None)
+
+METRICS = Registry()
+REQUEST_SECONDS = METRICS.histogram("flipdeck_request_seconds", "Request time by endpoint, including session save.")
+RENDER_SECONDS = METRICS.histogram("flipdeck_template_render_seconds", "page() render time by page.")
+COMPILE_SECONDS = METRICS.histogram("flipdeck_template_compile_seconds", "Jinja compile time on template cache misses.")
+STORE_SECONDS = METRICS.histogram("flipdeck_store_seconds", "Store call time by operation.")
+SESSION_SAVE_SECONDS = METRICS.histogram("flipdeck_session_save_seconds", "Session save time, including any backend write.")
+RESPONSE_BYTES = METRICS.histogram("flipdeck_response_bytes", "Response body size by endpoint (unstreamed).", SIZE_BUCKETS)
+COOKIE_BYTES = METRICS.histogram("flipdeck_session_cookie_bytes", "Session cookie size sent by the browser.",
+                                 (64, 128, 256, 512, 1024, 2048, 4096))
+RESPONSES = METRICS.counter("flipdeck_responses_total", "Responses by endpoint and status.")
+STATS_WRITES = METRICS.counter("flipdeck_stats_writes_total", "Grades written to the review stats.")
+
+# FLIPDECK_PROFILE_DIR turns on the slow-request profiler.
+PROFILER = SlowRequestProfiler(os.environ["FLIPDECK_PROFILE_DIR"],
+                               float(os.environ.get("FLIPDECK_PROFILE_SAMPLE", 0.1)),
+                               float(os.environ.get("FLIPDECK_PROFILE_SLOW_MS", 200))) \
+    if os.environ.get("FLIPDECK_PROFILE_DIR") else None
+
+class TimedSessionInterface(ServerSessionInterface):
+    def save_session(self, app, session, response):
+        with SESSION_SAVE_SECONDS.time():
+            super().save_session(app, session, response)
+
+app.session_interface = TimedSessionInterface(open_kv(SESSIONS))
+
+@app.before_request
+def start_request_timer():
+    g.started = time.perf_counter()
+    g.profile = PROFILER.start() if PROFILER else None
+
+@app.after_request
+def count_response(resp):
+    endpoint = request.endpoint or "unknown"
+    RESPONSES.inc(endpoint=endpoint, status=resp.status_code)
+    if not resp.is_streamed and resp.content_length is not None:
+        RESPONSE_BYTES.observe(resp.content_length, endpoint=endpoint)
+    cookie = request.cookies.get(app.config["SESSION_COOKIE_NAME"])
+    if cookie:
+        COOKIE_BYTES.observe(len(cookie))
+    return resp
+
+# Registered after count_response so it runs first: the byte counts are what goes on the wire.
+@app.after_request
+def compress_response(resp):
+    if (resp.status_code != 200 or resp.direct_passthrough or "Content-Encoding" in resp.headers
+            or resp.mimetype not in COMPRESSIBLE):
+        return resp
+    resp.vary.add("Accept-Encoding")
+    if resp.is_streamed:
+        coding = choose_coding(request.accept_encodings, codings=("gzip",))
+        if coding:
+            resp.response = gzip_stream(resp.response)
+    else:
+        coding = choose_coding(request.accept_encodings, resp.content_length or 0)
+        if coding:
+            resp.set_data(encode(resp.get_data(), coding))
+    if coding:
+        resp.headers["Content-Encoding"] = coding
+        etag, weak = resp.get_etag()
+        if etag:
+            resp.set_etag(tagged(etag, coding), weak)
+    return resp
+
+@app.teardown_request
+def stop_request_timer(exc):
+    started = g.pop("started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    REQUEST_SECONDS.observe(elapsed, endpoint=request.endpoint or "unknown")
+    prof = g.pop("profile", None)
+    if prof is not None:
+        PROFILER.stop(prof, elapsed, request.endpoint)
+
+store = TimedStore(open_store(DB), STORE_SECONDS)
+users = Users(store)
+events = EventLog(EVENTS_DIR)
+scheduler = Scheduler(store, events)
+search_index = SearchIndex(store)
+dedupe = Dedupe(store)
+analytics = Analytics(store, events)
+review_states = ReviewStates(SESSIONS)
+render_cache = LRUCache(RENDER_CACHE_ITEMS, RENDER_CACHE_BYTES)
+jobs = JobRunner(JOB_WORKERS, DB)
+assets = Assets(os.path.join(os.path.dirname(os.path.abspath(__file__)), "static"))
+app.jinja_env.globals["asset_url"] = lambda name: url_for("asset", name=assets.name(name))
 
 def nav():
     return """
@@ -36,32 +148,7 @@ LAYOUT_TOP = """
 <meta charset="utf-8">
 <title>FlipDeck</title>
 <meta name="viewport" content="width=device-width, initial-scale=1" />
-<style>
-  .form-narrow input[type=text],
-  .form-narrow input[type=password],
-  .form-narrow textarea {
-    max-width: 420px;
-  }
-  :root { font-family: system-ui, -apple-system, Segoe UI, Roboto, sans-serif; }
-  body{ margin:0; background:#0b0b0c; color:#f4f4f5;}
-  .wrap{max-width:900px;margin:0 auto;padding:16px;}
-  .card{background:#151518;border:1px solid #23232a;border-radius:16px;padding:16px;margin:12px 0;}
-  .grid{display:grid;gap:12px;}
-  .grid-2{grid-template-columns:repeat(2,1fr)}
-  input[type=text], input[type=password], textarea{
-    width:100%; padding:10px; border-radius:10px; border:1px solid #2b2b33; background:#101014; color:#f4f4f5;
-  }
-  .btn, button{background:#3a76ff;border:none;padding:10px 14px;border-radius:10px;color:white;cursor:pointer;text-decoration:none;display:inline-block}
-  .btn.secondary{background:#2b2b33}
-  .nav{display:flex;justify-content:space-between;align-items:center;padding:12px 16px;border-bottom:1px solid #23232a;position:sticky;top:0;background:#0b0b0c}
-  .nav a{color:#e9e9ee;margin-left:12px;text-decoration:none}
-  .left{font-weight:700}
-  .hint{color:#b5b5c0;font-size:0.95rem}
-  .ok{color:#7efcb3} .warn{color:#ffc36a} .err{color:#ff8f8f}
-  .row{display:flex;gap:8px;flex-wrap:wrap;align-items:center}
-  .kbd{border:1px solid #2b2b33;background:#101014;border-radius:6px;padding:2px 6px}
-  .meta{font-size:.9rem;color:#b5b5c0}
-</style>
+<link rel="stylesheet" href="{{ asset_url('flipdeck.css') }}">
 </head>
 <body>
 """ + nav() + """
@@ -77,46 +164,119 @@ LAYOUT_TOP = """
 
 LAYOUT_BOTTOM = """
 </div>
-<script>
-document.addEventListener('keydown', (e)=>{
-  const elShow = document.getElementById('btn-show');
-  const elC = document.getElementById('btn-correct');
-  const elI = document.getElementById('btn-incorrect');
-  if(!elShow && !elC && !elI) {
-    // no review hotkeys visible; keep going to check for Ctrl+Enter on forms
-  } else {
-    if (e.code === 'Space' && elShow) { e.preventDefault(); elShow.click(); }
-    if (e.key.toLowerCase() === 'c' && elC) { elC.click(); }
-    if (e.key.toLowerCase() === 'i' && elI) { elI.click(); }
-  }
-
-  // Ctrl/Cmd + Enter submits the first form that opts in
-  if ((e.ctrlKey || e.metaKey) && e.key === 'Enter') {
-    const form = document.querySelector('form[data-ctrl-enter="true"]');
-    if (form) { e.preventDefault(); form.requestSubmit(); }
-  }
-});
-</script>
+<script src="{{ asset_url('flipdeck.js') }}" defer></script>
 
 </body></html>
 """
 
-def page(content, **ctx):
-    return render_template_string(LAYOUT_TOP + content + LAYOUT_BOTTOM, **ctx)
+# Page bodies by name. Each one is wrapped in the layout and compiled once;
+# later requests only render the cached Jinja template.
+PAGES = {}
+TEMPLATES = {}
+TEMPLATE_STATS = Counter()
+TEMPLATE_VERSION = ""   # digest of the page sources; part of every ETag
+
+def compiled(name):
+    tpl = TEMPLATES.get(name)
+    if tpl is None:
+        TEMPLATE_STATS["misses"] += 1
+        with COMPILE_SECONDS.time(page=name):
+            tpl = TEMPLATES[name] = app.jinja_env.from_string(LAYOUT_TOP + PAGES[name] + LAYOUT_BOTTOM)
+    else:
+        TEMPLATE_STATS["hits"] += 1
+    return tpl
 
-def authed(): return "user" in session
+def warm_templates():
+    global TEMPLATE_VERSION
+    h = hashlib.blake2b((assets.version + LAYOUT_TOP + LAYOUT_BOTTOM).encode(), digest_size=8)
+    for name in sorted(PAGES):
+        h.update(name.encode() + PAGES[name].encode())
+        if name not in TEMPLATES:
+            compiled(name)
+    TEMPLATE_VERSION = h.hexdigest()
+
+def page(name, **ctx):
+    app.update_template_context(ctx)
+    tpl = compiled(name)
+    with RENDER_SECONDS.time(page=name):
+        return tpl.render(ctx)
+
+def stream_page(name, chunk=0, **ctx):
+    # Sends the page as Jinja produces it, so generators in ctx are consumed lazily.
+    # chunk > 0 groups that many template pieces into each write.
+    app.update_template_context(ctx)
+    body = compiled(name).stream(ctx)
+    if chunk:
+        body.enable_buffering(chunk)
+    return app.response_class(stream_with_context(body))
+
+def cached_page(key, render, cache=True):
+    # `key` must pin down everything the page shows: user, view, store version
+    # and request args. Its digest is the ETag; a matching If-None-Match gets a
+    # 304 and other hits reuse the rendered, already compressed body.
+    # cache=False (streamed pages) only does the ETag part.
+    if "_flashes" in session:       # a pending flash makes this render one-off
+        return render()
+    etag = hashlib.blake2b(repr((TEMPLATE_VERSION, key)).encode(), digest_size=16).hexdigest()
+    # Streamed pages can only be compressed on the fly, which gzip_stream does.
+    coding = choose_coding(request.accept_encodings, codings=CODINGS if cache else ("gzip",))
+    if request.if_none_match.contains(tagged(etag, coding)):
+        resp = app.response_class(status=304)
+    else:
+        body = render_cache.get((key, coding)) if cache else None
+        if body is None:
+            body = render()
+            if cache:
+                body = encode(body.encode(), coding)
+                render_cache.put((key, coding), body)
+        resp = app.make_response(body)
+        if coding:
+            if not cache:
+                resp.response = gzip_stream(resp.response)
+            resp.headers["Content-Encoding"] = coding
+    resp.set_etag(tagged(etag, coding))
+    resp.vary.add("Accept-Encoding")
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+def authed(): return "user" in session and users.get(session["user"]) is not None
 def require_auth():
     if not authed():
         flash("Please log in first.", "warn")
         return redirect(url_for("login"))
 
+def session_id():
+    # Opaque key for review_states; kept across logins, unlike the session's own id.
+    sid = session.get("sid")
+    if sid is None:
+        sid = session["sid"] = secrets.token_urlsafe(12)
+    return sid
+
+def compact_events():
+    # Raw events past the retention window are dropped; the store keeps the totals.
+    return events.compact(date.today() - timedelta(days=EVENTS_RETAIN_DAYS))
+
+def compact_loop():
+    while True:
+        time.sleep(COMPACT_EVERY)
+        compact_events()
+        app.session_interface.kv.purge()
+        review_states.purge()
+
+compactor = None
+
+@app.before_request
+def start_compactor():
+    global compactor
+    if compactor is None and COMPACT_EVERY:
+        compactor = threading.Thread(target=compact_loop, name="compact-events", daemon=True)
+        compactor.start()
+
 @app.context_processor
 def inject_session():
     return dict(session=session)
 
-@app.route("/")
-def home():
-    return page("""
+PAGES["home"] = """
       <div class="card">
         <h2>Flashcards & Study</h2>
         <p class="hint">Turn your notes into spaced-repetition flashcards—fast. (IH1)</p>
@@ -129,17 +289,38 @@ def home():
           <a class="btn" href="{{ url_for('decks_home') }}">Go to Decks</a>
         {% endif %}
       </div>
-    """)
+    """
 
-@app.route("/help")
-def help_page():
-    return page("""
+@app.route("/")
+def home():
+    return page("home")
+
+PAGES["help_page"] = """
       <div class="card">
         <h3>Help</h3>
         <p class="hint">Use <span class="kbd">/</span> to focus search, <span class="kbd">Space</span> to show answer, <span class="kbd">C</span>/<span class="kbd">I</span> to grade. (IH7)</p>
         <p>Cancel buttons won’t save changes. (IH2) Back links are present. (IH5)</p>
       </div>
-    """)
+    """
+
+@app.route("/help")
+def help_page():
+    return page("help_page")
+
+PAGES["signup"] = """
+      <div class="card grid">
+        <h2>Create Account</h2>
+        <form method="post" class="grid form-narrow">
+          <label>Email <input name="email" type="text" placeholder="you@school.edu"></label>
+          <label>Password <input name="password" type="password" placeholder="••••••••"></label>
+          <div class="row">
+            <button class="btn">Create Account</button>
+            <a class="btn secondary" href="{{ url_for('home') }}">Cancel</a>
+          </div>
+          <p class="hint">Demo data only. (IH2)</p>
+        </form>
+      </div>
+    """
 
 @app.route("/signup", methods=["GET","POST"])
 def signup():
@@ -148,52 +329,43 @@ def signup():
         pw = request.form.get("password") or ""
         if not email or not pw:
             flash("Email and password are required.", "err")
-        elif email in USERS:
+        elif not users.add(email, pw):
             flash("Account already exists. Please log in.", "warn")
             return redirect(url_for("login"))
         else:
-            USERS[email] = {"password": pw}
+            session.regenerate()
             session["user"] = email
             flash("Welcome! Account created.", "ok")
             return redirect(url_for("decks_home"))
-    return page("""
+    return page("signup")
+
+PAGES["login"] = """
       <div class="card grid">
-        <h2>Create Account</h2>
+        <h2>Login</h2>
         <form method="post" class="grid form-narrow">
-          <label>Email <input name="email" type="text" placeholder="you@school.edu"></label>
-          <label>Password <input name="password" type="password" placeholder="••••••••"></label>
+          <label>Email <input name="email" type="text" autofocus></label>
+          <label>Password <input name="password" type="password"></label>
           <div class="row">
-            <button class="btn">Create Account</button>
+            <button class="btn">Login</button>
             <a class="btn secondary" href="{{ url_for('home') }}">Cancel</a>
           </div>
-          <p class="hint">Demo data only. (IH2)</p>
         </form>
       </div>
-    """)
+    """
 
 @app.route("/login", methods=["GET","POST"])
 def login():
     if request.method == "POST":
         email = (request.form.get("email") or "").strip().lower()
         pw = (request.form.get("password") or "")
-        if email in USERS and USERS[email]["password"] == pw:
+        user = users.get(email)
+        if user and user["password"] == pw:
+            session.regenerate()
             session["user"] = email
             flash("Logged in.", "ok")
             return redirect(url_for("decks_home"))
         flash("Invalid credentials.", "err")
-    return page("""
-      <div class="card grid">
-        <h2>Login</h2>
-        <form method="post" class="grid form-narrow">
-          <label>Email <input name="email" type="text" autofocus></label>
-          <label>Password <input name="password" type="password"></label>
-          <div class="row">
-            <button class="btn">Login</button>
-            <a class="btn secondary" href="{{ url_for('home') }}">Cancel</a>
-          </div>
-        </form>
-      </div>
-    """)
+    return page("login")
 
 @app.route("/logout")
 def logout():
@@ -201,19 +373,15 @@ def logout():
     flash("Logged out.", "ok")
     return redirect(url_for("home"))
 
-@app.route("/decks")
-def decks_home():
-    if not authed(): return require_auth()
-    email = session["user"]
-    query = (request.args.get("q") or "").strip().lower()
-    decks = DECKS[email]
-    if query:
-        decks = [d for d in decks if query in d["title"].lower()]
-    return page("""
+PAGES["decks_home"] = """
       <div class="card">
         <div class="row" style="justify-content:space-between">
           <h2>Decks Home</h2>
-          <a class="btn" href="{{ url_for('new_deck') }}">New Deck</a>
+          <div class="row">
+            <a class="btn secondary" href="{{ url_for('export_account') }}">Back Up</a>
+            <a class="btn secondary" href="{{ url_for('restore_account') }}">Restore</a>
+            <a class="btn" href="{{ url_for('new_deck') }}">New Deck</a>
+          </div>
         </div>
         <form method="get" class="row" style="margin:8px 0">
           <input name="q" type="text" placeholder="Search title or #tag (press / to focus)" onkeydown="if(event.key=='/'){this.focus();event.preventDefault();}" value="{{ request.args.get('q','') }}">
@@ -225,7 +393,7 @@ def decks_home():
               <div class="card">
                 <div class="row" style="justify-content:space-between">
                   <div>
-                     <strong>{{ d.title }}</strong> <span class="meta">({{ d.cards|length }} cards)</span>
+                     <strong>{{ d.title }}</strong> <span class="meta">({{ d.n_cards }} cards, {{ due[d.id] }} due)</span>
                   </div>
                   <div class="row">
                     <a class="btn secondary" href="{{ url_for('deck_detail', deck_id=d.id) }}">Open</a>
@@ -239,23 +407,28 @@ def decks_home():
           <p class="hint">No decks yet. Click <em>New Deck</em> to create your first study set. (IH3)</p>
         {% endif %}
       </div>
-    """, decks=decks)
+    """
 
-@app.route("/decks/new", methods=["GET","POST"])
-def new_deck():
+@app.route("/decks")
+def decks_home():
     if not authed(): return require_auth()
     email = session["user"]
-    if request.method == "POST":
-        title = (request.form.get("title") or "").strip()
-        desc = (request.form.get("desc") or "").strip()
-        if not title:
-            flash("Deck name is required.", "err")
-        else:
-            d = {"id": str(uuid.uuid4())[:8], "title": title, "desc": desc, "cards": []}
-            DECKS[email].append(d)
-            flash("Deck created.", "ok")
-            return redirect(url_for("decks_home"))
-    return page("""
+    query = (request.args.get("q") or "").strip().lower()
+    if not query:
+        search_index.warm(email)
+
+    def render():
+        decks = store.list_decks(email)
+        if query:
+            decks = search_index.search(email, decks, query)
+        due = {d["id"]: scheduler.due_count(email, d) for d in decks}
+        return page("decks_home", decks=decks, due=due)
+    # Cards fall due as time passes, so the key also rolls over every DUE_COUNT_TTL.
+    key = (email, "decks_home", store.list_version(email), int(time.time() // DUE_COUNT_TTL),
+           request.args.get("q", ""))
+    return cached_page(key, render)
+
+PAGES["new_deck"] = """
       <div class="card grid">
         <h2>Create Deck</h2>
         <form method="post" class="grid">
@@ -268,30 +441,45 @@ def new_deck():
           <p class="hint">Cancel won’t save. (IH2) Nav stays consistent. (IH4)</p>
         </form>
       </div>
-    """)
+    """
 
-@app.route("/deck/<deck_id>")
-def deck_detail(deck_id):
+@app.route("/decks/new", methods=["GET","POST"])
+def new_deck():
     if not authed(): return require_auth()
     email = session["user"]
-    deck = next((d for d in DECKS[email] if d["id"] == deck_id), None)
-    if not deck:
-        flash("Deck not found.", "err")
-        return redirect(url_for("decks_home"))
-    return page("""
+    if request.method == "POST":
+        title = (request.form.get("title") or "").strip()
+        desc = (request.form.get("desc") or "").strip()
+        if not title:
+            flash("Deck name is required.", "err")
+        else:
+            store.add_deck(email, title, desc)
+            flash("Deck created.", "ok")
+            return redirect(url_for("decks_home"))
+    return page("new_deck")
+
+PAGES["deck_detail"] = """
       <div class="card">
         <div class="row" style="justify-content:space-between">
           <div><a class="btn secondary" href="{{ url_for('decks_home') }}">&lt; Back</a></div>
-          <h2>{{ deck.title }}</h2>
+          <h2>{{ deck.title }} <span class="meta">{{ deck.n_cards }} cards</span></h2>
           <div class="row">
             <a class="btn" href="{{ url_for('add_card', deck_id=deck.id) }}">New Card</a>
+            <a class="btn secondary" href="{{ url_for('import_cards', deck_id=deck.id) }}">Import</a>
+            <form method="post" action="{{ url_for('export_deck', deck_id=deck.id) }}" class="row">
+              <button class="btn secondary" name="format" value="csv">Export CSV</button>
+              <button class="btn secondary" name="format" value="ndjson">Export NDJSON</button>
+            </form>
+            <form method="post" action="{{ url_for('find_duplicates', deck_id=deck.id) }}">
+              <button class="btn secondary">Find Duplicates</button>
+            </form>
             <a class="btn" href="{{ url_for('review_session', deck_id=deck.id) }}">Start Review</a>
           </div>
         </div>
 
-        {% if deck.cards %}
+        {% if deck.n_cards %}
           <div class="grid">
-            {% for c in deck.cards %}
+            {% for c in cards %}
               <div class="card">
                 <!-- Row with content on the left and Edit aligned to the right -->
                 <div class="row">
@@ -302,24 +490,98 @@ def deck_detail(deck_id):
                   </div>
                   <!-- Actions aligned right -->
                   <div class="row" style="margin-left:auto">
-                    <a class="btn secondary" href="{{ url_for('edit_card', deck_id=deck.id, i=loop.index0) }}">Edit</a>
+                    <a class="btn secondary" href="{{ url_for('edit_card', deck_id=deck.id, card_id=c.id) }}">Edit</a>
                   </div>
                 </div>
               </div>
             {% endfor %}
           </div>
+          <div class="row" style="margin-top:8px">
+            {% if after is not none and after >= 0 %}
+              <a class="btn secondary" href="{{ url_for('deck_detail', deck_id=deck.id, size=size) }}">First Page</a>
+            {% endif %}
+            {% if next_after is not none %}
+              <a class="btn secondary" href="{{ url_for('deck_detail', deck_id=deck.id, after=next_after, size=size) }}">Next Page</a>
+            {% endif %}
+            {% if after is not none %}
+              <a class="btn secondary" href="{{ url_for('deck_detail', deck_id=deck.id, all=1) }}">Show All</a>
+            {% endif %}
+          </div>
         {% else %}
           <p class="hint">This deck is empty. Click <em>New Card</em> to create your first flashcard. (IH3)</p>
         {% endif %}
       </div>
-    """, deck=deck)
+    """
 
+DECK_PAGE_SIZE = 50
+DECK_PAGE_MAX = 500
+DECK_STREAM_CHUNK = 200     # template pieces per write when streaming a whole deck
+
+@app.route("/deck/<deck_id>")
+def deck_detail(deck_id):
+    if not authed(): return require_auth()
+    email = session["user"]
+    deck = store.get_deck(email, deck_id)
+    if not deck:
+        flash("Deck not found.", "err")
+        return redirect(url_for("decks_home"))
+    if request.args.get("all"):
+        # Rows go out as they are read, so big decks start rendering at once.
+        return cached_page((email, "deck_detail", deck_id, deck["version"], "all"), lambda: stream_page(
+            "deck_detail", chunk=DECK_STREAM_CHUNK, deck=deck, after=None, next_after=None,
+            cards=store.iter_cards(email, deck_id)), cache=False)
+    size = min(max(request.args.get("size", DECK_PAGE_SIZE, type=int), 1), DECK_PAGE_MAX)
+    after = request.args.get("after", -1, type=int)
+
+    def render():
+        cards = list(store.iter_cards(email, deck_id, after, size + 1))
+        next_after = cards[size - 1]["pos"] if len(cards) > size else None
+        return page("deck_detail", deck=deck, cards=cards[:size], after=after, next_after=next_after, size=size)
+    return cached_page((email, "deck_detail", deck_id, deck["version"], after, size), render)
+
+
+PAGES["add_card"] = """
+      <div class="card grid">
+        <h2>Add Card to {{ deck.title }}</h2>
+        {% if dupes %}
+          <div class="card">
+            <div class="warn">This card looks like {{ "a card" if dupes|length == 1 else "cards" }} already in the deck:</div>
+            {% for sim, c in dupes %}
+              <div class="row meta">
+                <div>{{ "same text" if sim == 1 else "%.0f%% similar"|format(sim * 100) }}: {{ c.front }} / {{ c.back }}</div>
+                <a href="{{ url_for('edit_card', deck_id=deck.id, card_id=c.id) }}">Edit</a>
+              </div>
+            {% endfor %}
+          </div>
+        {% endif %}
+        <form method="post" class="grid" data-ctrl-enter="true">
+          <label>Front (Prompt):
+            <textarea name="front" rows="2" placeholder="e.g., Define homeostasis" autofocus>{{ draft.front }}</textarea>
+          </label>
+          <label>Back (Answer):
+            <textarea name="back" rows="2" placeholder="e.g., Homeostasis is...">{{ draft.back }}</textarea>
+          </label>
+          <label>Hint (Optional):
+            <input name="hint" type="text" placeholder="Short cue" value="{{ draft.hint }}" />
+          </label>
+          <div class="row">
+            {% if dupes %}
+              <button class="btn" name="force" value="1">Save Anyway</button>
+            {% else %}
+              <button class="btn">Save Card</button>
+            {% endif %}
+            <a class="btn secondary" href="{{ url_for('deck_detail', deck_id=deck.id) }}">Cancel</a>
+          </div>
+          <p class="hint">Press <span class="kbd">Ctrl</span>+<span class="kbd">Enter</span> to save. (IH7)</p>
+        </form>
+      </div>
+    """
 
 @app.route("/deck/<deck_id>/add", methods=["GET","POST"])
 def add_card(deck_id):
     if not authed(): return require_auth()
     email = session["user"]
-    deck = next((d for d in DECKS[email] if d["id"] == deck_id), None)
+    deck = store.get_deck(email, deck_id)
     if not deck:
         flash("Deck not found.", "err")
         return redirect(url_for("decks_home"))
@@ -330,58 +592,296 @@ def add_card(deck_id):
         if not front or not back:
             flash("Front and Back are required.", "err")
         else:
-            deck["cards"].append({"front": front, "back": back, "hint": hint})
+            dupes = [] if request.form.get("force") else dedupe.check(email, deck, front, back)
+            if dupes:
+                return page("add_card", deck=deck, dupes=dupes, draft={"front": front, "back": back, "hint": hint})
+            card = store.add_card(email, deck, front, back, hint)
+            scheduler.added(email, deck, [card])
             flash("Card saved to deck.", "ok")
             return redirect(url_for("add_card", deck_id=deck_id))
-    return page("""
+    else:
+        dedupe.warm(email, deck)
+    return page("add_card", deck=deck, draft={})
+
+PAGES["import_cards"] = """
       <div class="card grid">
-        <h2>Add Card to {{ deck.title }}</h2>
-        <form method="post" class="grid" data-ctrl-enter="true">
-          <label>Front (Prompt):
-            <textarea name="front" rows="2" placeholder="e.g., Define homeostasis" autofocus></textarea>
-          </label>
-          <label>Back (Answer):
-            <textarea name="back" rows="2" placeholder="e.g., Homeostasis is..."></textarea>
-          </label>
-          <label>Hint (Optional):
-            <input name="hint" type="text" placeholder="Short cue" />
+        <h2>Import Cards into {{ deck.title }}</h2>
+        <form method="post" enctype="multipart/form-data" class="grid form-narrow">
+          <label>File <input name="file" type="file" accept=".csv,.tsv,.txt,.ndjson,.jsonl,.gz"></label>
+          <label>Format
+            <select name="format">
+              <option value="">Detect from file name</option>
+              <option value="csv">CSV (front,back,hint)</option>
+              <option value="tsv">TSV (front, back, hint separated by tabs)</option>
+              <option value="anki">Anki text export</option>
+              <option value="ndjson">FlipDeck export (NDJSON)</option>
+            </select>
           </label>
           <div class="row">
-            <button class="btn">Save Card</button>
+            <button class="btn">Import</button>
             <a class="btn secondary" href="{{ url_for('deck_detail', deck_id=deck.id) }}">Cancel</a>
           </div>
-          <p class="hint">Press <span class="kbd">Ctrl</span>+<span class="kbd">Enter</span> to save. (IH7)</p>
+          <p class="hint">One card per row: front, back and an optional hint. A header row is skipped.</p>
         </form>
       </div>
-    """, deck=deck)
+    """
+
+def run_events(job, events, spooled, done):
+    # Drives an importer event generator inside a job; progress is how far
+    # into the spooled upload the reader has got.
+    size = os.fstat(spooled.fileno()).st_size or 1
+    total = 0
+    try:
+        for ev in events:
+            if ev["kind"] == "error":
+                job.note(f"Line {ev['line']}: {ev['msg']}", "err")
+            elif ev["kind"] == "deck":
+                job.note(f"Deck {ev['title']}")
+            elif ev["kind"] == "done":
+                job.summary = done(ev)
+                continue
+            total = ev.get("imported", total)
+            job.summary = f"{total} cards so far…"
+            job.update(spooled.tell() / size)
+    except Cancelled:
+        job.summary = f"Cancelled after {total} cards."
+        raise
+    finally:
+        events.close()
+
+def import_job(job, email, deck, spooled, fmt):
+    def saved(cards):
+        scheduler.added(email, deck, cards)
+
+    run_events(job, importer.import_cards(store, email, deck, spooled, fmt, saved), spooled,
+               lambda ev: f"{ev['imported']} cards imported" + (f", {ev['failed']} rows skipped." if ev["failed"] else "."))
+
+def start_job(kind, title, fn, *args, back):
+    try:
+        job = jobs.submit(session["user"], kind, title, fn, *args, back=back)
+    except Busy:
+        flash("Too many jobs are running right now. Try again in a minute.", "warn")
+        return redirect(back)
+    return redirect(url_for("job_status", job_id=job.id))
 
-@app.route("/deck/<deck_id>/edit/<int:i>", methods=["GET", "POST"])
-def edit_card(deck_id, i):
+@app.route("/deck/<deck_id>/import", methods=["GET", "POST"])
+def import_cards(deck_id):
     if not authed(): return require_auth()
     email = session["user"]
-    deck = next((d for d in DECKS[email] if d["id"] == deck_id), None)
+    deck = store.get_deck(email, deck_id)
     if not deck:
         flash("Deck not found.", "err")
         return redirect(url_for("decks_home"))
+    if request.method == "POST":
+        upload = request.files.get("file")
+        if not upload or not upload.filename:
+            flash("Choose a file to import.", "err")
+            return redirect(url_for("import_cards", deck_id=deck_id))
+        fmt = importer.guess_format(upload.filename, request.form.get("format"))
+        return start_job("import", f"Importing into {deck['title']}", import_job, email, deck,
+                         importer.spool(upload), fmt, back=url_for("deck_detail", deck_id=deck_id))
+    return page("import_cards", deck=deck)
 
-    if i < 0 or i >= len(deck["cards"]):
-        flash("Card not found.", "err")
-        return redirect(url_for("deck_detail", deck_id=deck_id))
+def download(chunks, filename, mimetype):
+    # ?gzip=1 sends a .gz file; otherwise compress_response may still gzip the transfer.
+    if request.args.get("gzip"):
+        chunks, filename, mimetype = gzip_stream(chunks), filename + ".gz", "application/gzip"
+    resp = app.response_class(chunks, mimetype=mimetype)
+    resp.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return resp
 
-    card = deck["cards"][i]
+def file_stem(title):
+    return re.sub(r"[^\w.-]+", "_", title).strip("_.")[:60] or "deck"
 
+def export_job(job, email, deck, fmt):
+    f = tempfile.NamedTemporaryFile("w", encoding="utf-8", newline="", suffix="." + fmt, delete=False)
+    job.file = (f.name, f"{file_stem(deck['title'])}.{fmt}", exporter.MIMETYPES[fmt])
+    lines, total = 0, deck["n_cards"] + 1
+    with f:
+        for chunk in exporter.export_deck(store, email, deck, fmt):
+            f.write(chunk)
+            lines += chunk.count("\n")
+            job.summary = f"{max(lines - 1, 0)} of {deck['n_cards']} cards written…"
+            job.update(lines / total)
+    job.summary = f"{deck['n_cards']} cards exported."
+
+@app.route("/deck/<deck_id>/export", methods=["GET", "POST"])
+def export_deck(deck_id):
+    # GET streams the export straight back; POST (the deck page) builds the
+    # file in a background job for download from the job page.
+    if not authed(): return require_auth()
+    email = session["user"]
+    deck = store.get_deck(email, deck_id)
+    if not deck:
+        flash("Deck not found.", "err")
+        return redirect(url_for("decks_home"))
+    fmt = request.values.get("format") if request.values.get("format") in exporter.MIMETYPES else "ndjson"
     if request.method == "POST":
-        front = (request.form.get("front") or "").strip()
-        back  = (request.form.get("back") or "").strip()
-        hint  = (request.form.get("hint") or "").strip()
-        if not front or not back:
-            flash("Front and Back are required.", "err")
-        else:
-            card["front"], card["back"], card["hint"] = front, back, hint
-            flash("Card updated.", "ok")
-            return redirect(url_for("deck_detail", deck_id=deck_id))
+        return start_job("export", f"Exporting {deck['title']}", export_job, email, deck, fmt,
+                         back=url_for("deck_detail", deck_id=deck_id))
+    return download(exporter.export_deck(store, email, deck, fmt), f"{file_stem(deck['title'])}.{fmt}",
+                    exporter.MIMETYPES[fmt])
 
-    return page("""
+@app.route("/account/export")
+def export_account():
+    if not authed(): return require_auth()
+    email = session["user"]
+    return download(exporter.export_account(store, email), f"flipdeck-{date.today().isoformat()}.ndjson",
+                    exporter.MIMETYPES["ndjson"])
+
+PAGES["restore_account"] = """
+      <div class="card grid">
+        <h2>Restore a Backup</h2>
+        <form method="post" enctype="multipart/form-data" class="grid form-narrow">
+          <label>Backup file <input name="file" type="file" accept=".ndjson,.jsonl,.gz"></label>
+          <div class="row">
+            <button class="btn">Restore</button>
+            <a class="btn secondary" href="{{ url_for('decks_home') }}">Cancel</a>
+          </div>
+          <p class="hint">Decks from the backup are added next to your own; review counts are merged.</p>
+        </form>
+      </div>
+    """
+
+def restore_job(job, email, spooled):
+    def saved(deck, cards):
+        scheduler.added(email, deck, cards)
+
+    run_events(job, importer.restore_account(store, email, spooled, saved), spooled,
+               lambda ev: f"{ev['decks']} decks and {ev['imported']} cards restored"
+                          + (f", {ev['failed']} lines skipped." if ev["failed"] else "."))
+
+@app.route("/account/restore", methods=["GET", "POST"])
+def restore_account():
+    if not authed(): return require_auth()
+    email = session["user"]
+    if request.method == "POST":
+        upload = request.files.get("file")
+        if not upload or not upload.filename:
+            flash("Choose a backup file.", "err")
+            return redirect(url_for("restore_account"))
+        return start_job("restore", "Restoring backup", restore_job, email, importer.spool(upload),
+                         back=url_for("decks_home"))
+    return page("restore_account")
+
+PAGES["job_status"] = """
+      <div class="card grid" id="job" data-poll="{{ url_for('api_job', job_id=job.id) }}">
+        <h2>{{ job.title }}</h2>
+        <div class="row">
+          <progress id="job-progress" max="100" value="{{ '%.1f'|format(job.progress * 100) }}"></progress>
+          <span class="meta" id="job-state">{{ job.state }}</span>
+        </div>
+        <div id="job-summary" class="{{ 'err' if job.error else 'ok' if job.state == 'done' else 'meta' }}">{{ job.error or job.summary }}</div>
+        {% for cls, text in job.notes %}
+          <div class="{{ cls }}">{{ text }}</div>
+        {% endfor %}
+        <div class="row">
+          {% if job.state in ("queued", "running") %}
+            <form method="post" action="{{ url_for('cancel_job', job_id=job.id) }}">
+              <button class="btn secondary">Cancel</button>
+            </form>
+            <noscript><meta http-equiv="refresh" content="2"></noscript>
+          {% elif job.state == "done" and job.file %}
+            <a class="btn" href="{{ url_for('download_job', job_id=job.id) }}">Download</a>
+          {% elif job.state == "done" and job.link %}
+            <a class="btn" href="{{ job.link[1] }}">{{ job.link[0] }}</a>
+          {% endif %}
+          <a class="btn secondary" href="{{ job.back or url_for('decks_home') }}">Back</a>
+        </div>
+      </div>
+      <script src="{{ asset_url('job.js') }}" defer></script>
+    """
+
+def user_job(job_id):
+    job = jobs.get(job_id, session["user"])
+    if job is None:
+        abort(404)
+    return job
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    if not authed(): return require_auth()
+    return page("job_status", job=user_job(job_id))
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    if not authed(): return require_auth()
+    jobs.cancel(user_job(job_id).id, session["user"])
+    return redirect(url_for("job_status", job_id=job_id))
+
+@app.route("/jobs/<job_id>/download")
+def download_job(job_id):
+    if not authed(): return require_auth()
+    job = user_job(job_id)
+    if job.state != DONE or not job.file:
+        abort(404)
+    path, name, mimetype = job.file
+    return send_file(path, mimetype=mimetype, as_attachment=True, download_name=name)
+
+@app.route("/api/jobs/<job_id>")
+def api_job(job_id):
+    if not authed():
+        return jsonify(error="Please log in first."), 401
+    job = jobs.get(job_id, session["user"])
+    if job is None:
+        return jsonify(error="Job not found."), 404
+    return jsonify(job.as_dict())
+
+PAGES["duplicates"] = """
+      <div class="card grid">
+        <div class="row" style="justify-content:space-between">
+          <h2>Duplicates — {{ deck.title }}</h2>
+          <a class="btn secondary" href="{{ url_for('deck_detail', deck_id=deck.id) }}">&lt; Back</a>
+        </div>
+        {% if not groups %}
+          <div class="meta">No duplicate cards found.</div>
+        {% endif %}
+        {% for g in groups %}
+          <div class="card">
+            <div class="meta">{{ g.ids|length }} cards, {{ "same text" if g.kind == "exact" else "about %.0f%% similar"|format(g.similarity * 100) }}</div>
+            {% for cid in g.ids if cid in cards %}
+              <div class="row" style="justify-content:space-between">
+                <div>{{ cards[cid].front }} / {{ cards[cid].back }}</div>
+                <a href="{{ url_for('edit_card', deck_id=deck.id, card_id=cid) }}">Edit</a>
+              </div>
+            {% endfor %}
+          </div>
+        {% endfor %}
+      </div>
+    """
+
+def duplicates_job(job, email, deck, base):
+    job.link = ("View Report", f"{base}/{job.id}")
+    groups = dedupe.report(email, deck, job.update)
+    n = sum(len(g["ids"]) for g in groups)
+    job.summary = f"{len(groups)} groups of duplicates ({n} cards)." if groups else "No duplicate cards found."
+    return groups
+
+@app.route("/deck/<deck_id>/duplicates", methods=["POST"])
+def find_duplicates(deck_id):
+    if not authed(): return require_auth()
+    email = session["user"]
+    deck = store.get_deck(email, deck_id)
+    if not deck:
+        flash("Deck not found.", "err")
+        return redirect(url_for("decks_home"))
+    # The report lives at <this url>/<job id>; the job adds its id, as there is no request context there.
+    return start_job("duplicates", f"Finding duplicates in {deck['title']}", duplicates_job, email, deck,
+                     url_for("find_duplicates", deck_id=deck_id),
+                     back=url_for("deck_detail", deck_id=deck_id))
+
+@app.route("/deck/<deck_id>/duplicates/<job_id>")
+def duplicates_report(deck_id, job_id):
+    if not authed(): return require_auth()
+    email = session["user"]
+    deck = store.get_deck(email, deck_id)
+    job = user_job(job_id)
+    if not deck or job.kind != "duplicates" or job.state != DONE:
+        abort(404)
+    ids = [cid for g in job.result for cid in g["ids"]]
+    return page("duplicates", deck=deck, groups=job.result, cards=store.get_cards(email, deck_id, ids) if ids else {})
+
+PAGES["edit_card"] = """
       <div class="card grid">
         <div class="row" style="justify-content:space-between">
           <h2>Edit Card — {{ deck.title }}</h2>
@@ -404,55 +904,51 @@ def edit_card(deck_id, i):
           <p class="hint">Tip: Press <span class="kbd">Ctrl</span>+<span class="kbd">Enter</span> to save.</p>
         </form>
       </div>
-    """, deck=deck, card=card)
+    """
 
-@app.route("/review/<deck_id>", methods=["GET","POST"])
-def review_session(deck_id):
+@app.route("/deck/<deck_id>/edit/<card_id>", methods=["GET", "POST"])
+def edit_card(deck_id, card_id):
     if not authed(): return require_auth()
     email = session["user"]
-    deck = next((d for d in DECKS[email] if d["id"] == deck_id), None)
-    if not deck or not deck["cards"]:
-        flash("Need at least one card to review.", "warn")
-        return redirect(url_for("deck_detail", deck_id=deck_id if deck else ""))
+    deck = store.get_deck(email, deck_id)
+    if not deck:
+        flash("Deck not found.", "err")
+        return redirect(url_for("decks_home"))
 
-    key = f"idx:{email}:{deck_id}"
-    idx = session.get(key, 0)
-    reveal = session.get(f"reveal:{email}:{deck_id}", False)
+    card = store.get_card(email, deck_id, card_id)
+    if not card:
+        flash("Card not found.", "err")
+        return redirect(url_for("deck_detail", deck_id=deck_id))
 
     if request.method == "POST":
-        action = request.form.get("action")
-        if action == "show":
-            session[f"reveal:{email}:{deck_id}"] = True
-            return redirect(url_for("review_session", deck_id=deck_id))
-        elif action in ("correct", "incorrect"):
-            today = datetime.now().date().isoformat()
-            s = STATS[email]
-            if s["last_day"] != today:
-                s["streak"] = s["streak"] + 1 if s["last_day"] is not None else 1
-                s["last_day"] = today
-            s["today"][action] += 1
-            s["by_deck"][deck["title"]] += 1
-
-            idx = (idx + 1) % len(deck["cards"])
-            session[key] = idx
-            session[f"reveal:{email}:{deck_id}"] = False
-            return redirect(url_for("review_session", deck_id=deck_id))
+        front = (request.form.get("front") or "").strip()
+        back  = (request.form.get("back") or "").strip()
+        hint  = (request.form.get("hint") or "").strip()
+        if not front or not back:
+            flash("Front and Back are required.", "err")
+        else:
+            store.update_card(email, deck_id, card_id, front, back, hint)
+            flash("Card updated.", "ok")
+            return redirect(url_for("deck_detail", deck_id=deck_id))
+
+    return page("edit_card", deck=deck, card=card)
 
-    card = deck["cards"][idx]
-    progress = f"{idx+1}/{len(deck['cards'])}"
-    return page("""
+PAGES["review_session"] = """
       <div class="card">
         <div class="row" style="justify-content:space-between">
           <div><a class="btn secondary" href="{{ url_for('deck_detail', deck_id=deck.id) }}">&lt; Back</a></div>
-          <h2>{{ deck.title }} <span class="meta">Card {{ progress }}</span></h2>
+          <h2>{{ deck.title }} <span class="meta"><span id="due-count">{{ due }}</span> due</span></h2>
           <div class="row">
             <a class="btn" href="{{ url_for('grade_stats') }}">Stats</a>
           </div>
         </div>
 
+        <div id="review" data-next="{{ url_for('api_review_next', deck_id=deck.id) }}"
+             data-grades="{{ url_for('api_review_grades', deck_id=deck.id) }}">
         {% if not reveal %}
           <h3>{{ card.front }}</h3>
           <form method="post" class="row" style="margin-top:10px">
+            <input type="hidden" name="card" value="{{ card.id }}">
             <button id="btn-show" name="action" value="show" class="btn">Show Answer</button>
             <span class="hint">Press <span class="kbd">Space</span></span>
           </form>
@@ -467,23 +963,98 @@ def review_session(deck_id):
             {% endif %}
           </div>
           <form method="post" class="row" style="margin-top:10px">
+            <input type="hidden" name="card" value="{{ card.id }}">
             <button id="btn-correct" class="btn" name="action" value="correct">Correct (C)</button>
             <button id="btn-incorrect" class="btn secondary" name="action" value="incorrect">Incorrect (I)</button>
           </form>
           <p class="hint">Progress/time cues set expectations. (IH6)</p>
         {% endif %}
+        </div>
       </div>
-    """, deck=deck, card=card, reveal=reveal, progress=progress)
+      <script src="{{ asset_url('review.js') }}" defer></script>
+    """
 
-@app.route("/stats")
-def grade_stats():
+@app.route("/review/<deck_id>", methods=["GET","POST"])
+def review_session(deck_id):
     if not authed(): return require_auth()
     email = session["user"]
-    s = STATS[email]
-    today = s["today"]
-    total = today["correct"] + today["incorrect"]
-    acc = (today["correct"]/total*100) if total else 0
-    return page("""
+    deck = store.get_deck(email, deck_id)
+    if not deck or not deck["n_cards"]:
+        flash("Need at least one card to review.", "warn")
+        return redirect(url_for("deck_detail", deck_id=deck_id if deck else ""))
+
+    sid = session_id()
+
+    if request.method == "POST":
+        action = request.form.get("action")
+        if action == "show":
+            review_states.set(sid, deck_id, request.form.get("card"), True)
+            return redirect(url_for("review_session", deck_id=deck_id))
+        elif action in ("correct", "incorrect"):
+            card_id = request.form.get("card") or scheduler.next_card(email, deck)
+            STATS_WRITES.inc(scheduler.grade(email, deck, card_id, action))
+            review_states.clear(sid, deck_id)
+            return redirect(url_for("review_session", deck_id=deck_id))
+
+    card_id, reveal = review_states.get(sid, deck_id) or (None, False)
+    card = store.get_card(email, deck_id, card_id) if reveal and card_id else None
+    if card is None:
+        card_id, reveal = scheduler.next_card(email, deck), False
+        card = store.get_card(email, deck_id, card_id) if card_id else None
+    if card is None:
+        flash("Nothing is due in this deck right now. Come back later.", "ok")
+        return redirect(url_for("deck_detail", deck_id=deck_id))
+    due = scheduler.due_count(email, deck)
+    return page("review_session", deck=deck, card=card, reveal=reveal, due=due)
+
+REVIEW_PREFETCH_MAX = 100
+GRADE_BATCH_MAX = 1000
+
+def api_deck(deck_id):
+    if not authed():
+        return None, (jsonify(error="Please log in first."), 401)
+    deck = store.get_deck(session["user"], deck_id)
+    if not deck:
+        return None, (jsonify(error="Deck not found."), 404)
+    return deck, None
+
+@app.route("/api/review/<deck_id>/next")
+def api_review_next(deck_id):
+    deck, err = api_deck(deck_id)
+    if err: return err
+    email = session["user"]
+    n = min(max(request.args.get("n", 20, type=int), 1), REVIEW_PREFETCH_MAX)
+    ids = scheduler.upcoming(email, deck, n)
+    cards = store.get_cards(email, deck_id, ids)
+    return jsonify(due=scheduler.due_count(email, deck),
+                   cards=[{k: cards[i][k] for k in ("id", "front", "back", "hint", "due")} for i in ids if i in cards])
+
+@app.route("/api/review/<deck_id>/grades", methods=["POST"])
+def api_review_grades(deck_id):
+    deck, err = api_deck(deck_id)
+    if err: return err
+    email = session["user"]
+    # force=True: navigator.sendBeacon posts the JSON as text/plain.
+    data = request.get_json(force=True, silent=True) or {}
+    records = data.get("grades") if isinstance(data, dict) else None
+    if not isinstance(records, list) or len(records) > GRADE_BATCH_MAX:
+        return jsonify(error=f"Send up to {GRADE_BATCH_MAX} grades as a list."), 400
+    now, grades = time.time(), []
+    for g in records:
+        try:
+            ts = float(g.get("timestamp") or now)
+        except (AttributeError, TypeError, ValueError):
+            continue
+        if not math.isfinite(ts):
+            continue
+        if ts > 1e12:
+            ts /= 1000          # Date.now() milliseconds
+        grades.append((str(g.get("card")), g.get("grade"), min(ts, now)))
+    applied = scheduler.grade_many(email, deck, grades)
+    STATS_WRITES.inc(applied)
+    return jsonify(received=len(records), applied=applied, due=scheduler.due_count(email, deck))
+
+PAGES["grade_stats"] = """
       <div class="card">
         <h2>Today</h2>
         <p><strong>{{ total }}</strong> Reviews,
@@ -493,19 +1064,139 @@ def grade_stats():
           <div>Day Streak: {{ s.streak }}</div>
           <div>Last Session: {{ s.last_day or "—" }}</div>
         </div>
+        <h3 style="margin-top:16px">Reviews by Day</h3>
+        <form method="get" class="row">
+          <label>From <input name="from" type="date" value="{{ start }}"></label>
+          <label>To <input name="to" type="date" value="{{ end }}"></label>
+          <button class="btn secondary">Show</button>
+        </form>
+        <p><strong>{{ range_total.correct + range_total.incorrect }}</strong> Reviews,
+           <strong>{{ range_total.correct }}</strong> Correct between {{ start }} and {{ end }}</p>
+        {% for day, ok, bad in days %}
+          <div class="row meta"><div>{{ day }}</div><div>{{ ok }} correct, {{ bad }} incorrect</div></div>
+        {% endfor %}
         <h3 style="margin-top:16px">Total Reviews by Deck</h3>
         {% if s.by_deck %}
           <div class="grid">
-            {% for name, cnt in s.by_deck.items() %}
-              <div class="card">{{ name }} — {{ cnt }}</div>
+            {% for deck_id, cnt in s.by_deck.items() %}
+              <div class="card">{{ titles.get(deck_id, "Deleted deck") }} — {{ cnt }}</div>
             {% endfor %}
           </div>
         {% else %}
           <p class="hint">No reviews yet. Start a session from any deck.</p>
         {% endif %}
+        <h3 style="margin-top:16px">Accuracy by Week</h3>
+        {% for week, n, pct in a.accuracy if n %}
+          <div class="row meta">
+            <div>{{ week }}</div>
+            <progress max="100" value="{{ '%.0f'|format(pct) }}"></progress>
+            <div>{{ "%.0f"|format(pct) }}% of {{ n }}</div>
+          </div>
+        {% else %}
+          <p class="hint">No reviews in the last {{ a.accuracy|length }} weeks.</p>
+        {% endfor %}
+        {% if a.retention %}
+          <h3 style="margin-top:16px">Recall by Time Since Last Review</h3>
+          {% for label, n, pct in a.retention %}
+            <div class="row meta">
+              <div>{{ label }}</div>
+              <progress max="100" value="{{ '%.0f'|format(pct) }}"></progress>
+              <div>{{ "%.0f"|format(pct) }}% of {{ n }}</div>
+            </div>
+          {% endfor %}
+        {% endif %}
+        {% if a.hardest %}
+          <h3 style="margin-top:16px">Hardest Cards</h3>
+          {% for h in a.hardest %}
+            <div class="row meta">
+              <div>{{ h.card.front }} <span class="hint">({{ h.deck.title }})</span></div>
+              <div>{{ "%.0f"|format(h.error) }}% missed of {{ h.reviews }}</div>
+              <a href="{{ url_for('edit_card', deck_id=h.deck.id, card_id=h.card.id) }}">Edit</a>
+            </div>
+          {% endfor %}
+        {% endif %}
+        <h3 style="margin-top:16px">Due in the Next {{ a.forecast|length }} Days</h3>
+        {% set peak = a.forecast|map(attribute=1)|max %}
+        {% for day, n in a.forecast if n %}
+          <div class="row meta">
+            <div>{{ day }}</div>
+            <progress max="{{ peak }}" value="{{ n }}"></progress>
+            <div>{{ n }} cards</div>
+          </div>
+        {% else %}
+          <p class="hint">Nothing due.</p>
+        {% endfor %}
         <p class="hint" style="margin-top:12px">Inline confirmations appear after actions. (IH8)</p>
       </div>
-    """, today=today, total=total, acc=acc, s=s)
+    """
+
+def iso_day(value):
+    try:
+        return date.fromisoformat(value or "")
+    except ValueError:
+        return None
+
+@app.route("/stats")
+def grade_stats():
+    if not authed(): return require_auth()
+    email = session["user"]
+    day = date.today().isoformat()
+    end = iso_day(request.args.get("to")) or date.today()
+    start = iso_day(request.args.get("from")) or end - timedelta(days=6)
+    start, end = start.isoformat(), end.isoformat()
+
+    def render():
+        s = store.get_stats(email)
+        today = Counter()
+        for _, ok, bad in store.day_totals(email, day, day):
+            today.update(correct=ok, incorrect=bad)
+        total = today["correct"] + today["incorrect"]
+        acc = (today["correct"]/total*100) if total else 0
+        days = store.day_totals(email, start, end)
+        range_total = Counter(correct=sum(d[1] for d in days), incorrect=sum(d[2] for d in days))
+        titles = {d["id"]: d["title"] for d in store.list_decks(email)}
+        return page("grade_stats", today=today, total=total, acc=acc, s=s, start=start, end=end,
+                    days=days, range_total=range_total, titles=titles, a=analytics.summary(email))
+    return cached_page((email, "grade_stats", store.list_version(email), day, start, end), render)
+
+@app.route("/assets/<name>")
+def asset(name):
+    found = assets.get(name, request.accept_encodings)
+    if found is None:
+        abort(404)
+    mimetype, coding, body = found
+    resp = app.response_class(body, mimetype=mimetype)
+    if coding:
+        resp.headers["Content-Encoding"] = coding
+    resp.vary.add("Accept-Encoding")
+    resp.headers["Cache-Control"] = IMMUTABLE
+    return resp
+
+@app.route("/metrics")
+def metrics_page():
+    return app.response_class(METRICS.render(), mimetype="text/plain; version=0.0.4")
+
+METRICS.collectors.append(lambda: [
+    "# HELP flipdeck_template_cache_total Compiled-template cache lookups.",
+    "# TYPE flipdeck_template_cache_total counter",
+    *(f'flipdeck_template_cache_total{{result="{k}"}} {v}' for k, v in sorted(TEMPLATE_STATS.items())),
+    "# HELP flipdeck_render_cache_total Rendered-page cache lookups.",
+    "# TYPE flipdeck_render_cache_total counter",
+    f'flipdeck_render_cache_total{{result="hits"}} {render_cache.hits}',
+    f'flipdeck_render_cache_total{{result="misses"}} {render_cache.misses}',
+    "# HELP flipdeck_user_cache_total User record cache lookups.",
+    "# TYPE flipdeck_user_cache_total counter",
+    f'flipdeck_user_cache_total{{result="hits"}} {users.hits}',
+    f'flipdeck_user_cache_total{{result="misses"}} {users.misses}',
+    "# HELP flipdeck_jobs Background jobs in the job table by state.",
+    "# TYPE flipdeck_jobs gauge",
+    *(f'flipdeck_jobs{{state="{k}"}} {v}' for k, v in jobs.counts().items()),
+    "# HELP flipdeck_render_cache_bytes Rendered bodies held in the page cache.",
+    "# TYPE flipdeck_render_cache_bytes gauge",
+    f"flipdeck_render_cache_bytes {render_cache.bytes}",
+])
+
+warm_templates()
 
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,151 @@
+"""Learning analytics for the stats page.
+
+A user's raw reviews (the event log segments still within the retention
+window) are loaded as arrays of (card key, timestamp, grade) and reduced
+with NumPy to recall by time since the previous review of the same card.
+Per-card error rates come from the store's card totals, and accuracy over
+time from its daily rollups, both kept at write time and outliving the raw
+events; the 30-day forecast comes from the cards' due dates.
+
+Results are cached per user until the user's store version changes (every
+applied grade bumps it) or the day rolls over.
+"""
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+import threading
+
+from eventlog import RECORD, GRADE_CODES, user_key
+import numpy as np
+
+DAY = 86400
+WEEKS = 12              # accuracy history shown
+FORECAST_DAYS = 30
+HARDEST = 10            # cards listed by error rate
+MIN_REVIEWS = 3         # reviews before a card's error rate counts
+# (lower edge in days, label) for recall by time since the card's previous review
+RETENTION_BINS = ((0, "under 1 day"), (1, "1 day"), (2, "2–3 days"), (4, "4–7 days"),
+                  (8, "8–14 days"), (15, "15–30 days"), (31, "over 30 days"))
+EDGES = [lo for lo, _ in RETENTION_BINS]
+CORRECT = GRADE_CODES["correct"]
+KEY = 24                # deck id (8 bytes) + card id (16 bytes), as stored in the log
+MIX = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9)     # odd multipliers for the key hash
+
+# The key field spans the deck and card fields, so one comparison groups by
+# card; k0-k2 are the same bytes as integers, for hashing.
+RECORD_DTYPE = np.dtype({"names": ["ts", "user", "key", "k0", "k1", "k2", "grade"],
+                         "formats": ["<f8", "S8", f"S{KEY}", "<u8", "<u8", "<u8", "u1"],
+                         "offsets": [0, 8, 16, 16, 24, 32, 40], "itemsize": RECORD.size})
+
+
+def load(events, email):
+    """The user's logged reviews as (keys, codes, timestamps, grades).
+
+    keys[code] is the deck and card id bytes of each card reviewed; codes,
+    timestamps and grades have one entry per review, ordered by card, then time.
+    """
+    user = user_key(email)
+    cols = {"key": [np.empty(0, f"S{KEY}")], "ts": [np.empty(0)], "grade": [np.empty(0, "u1")],
+            "h": [np.empty(0, np.uint64)]}
+    for day in events.days():
+        recs = np.frombuffer(events.raw(day, email), RECORD_DTYPE)
+        recs = recs[recs["user"] == user]
+        for name in ("key", "ts", "grade"):
+            cols[name].append(recs[name])
+        cols["h"].append(recs["k0"] * np.uint64(MIX[0]) ^ recs["k1"] * np.uint64(MIX[1]) ^ recs["k2"] * np.uint64(MIX[2]))
+    key, ts, grade, h = (np.concatenate(cols[name]) for name in ("key", "ts", "grade", "h"))
+    # Sorting on a 64-bit hash of the key is several times faster than on the
+    # 24-byte keys; if two cards' hashes collide, sort on the key's bytes instead.
+    order = np.lexsort((ts, h))
+    keys, h = key[order], h[order]
+    new = np.ones(len(keys), bool)
+    new[1:] = keys[1:] != keys[:-1]
+    if (new[1:] != (h[1:] != h[:-1])).any():
+        order = np.lexsort((ts, key))
+        keys = key[order]
+        new[1:] = keys[1:] != keys[:-1]
+    return keys[new], np.cumsum(new) - 1, ts[order], grade[order]
+
+
+def retention(codes, ts, grades):
+    """[(label, reviews, recall %)] by days since the same card was last reviewed."""
+    again = codes[1:] == codes[:-1]
+    gaps = (ts[1:] - ts[:-1])[again] / DAY
+    b = np.searchsorted(EDGES, gaps, side="right") - 1
+    n = np.bincount(b, minlength=len(EDGES)).tolist()
+    ok = np.bincount(b, weights=grades[1:][again] == CORRECT, minlength=len(EDGES)).tolist()
+    return [(label, n[i], ok[i] / n[i] * 100) for i, (_, label) in enumerate(RETENTION_BINS) if n[i]]
+
+
+def forecast(dues, today):
+    """Cards due on each of the next FORECAST_DAYS days; overdue cards count for today."""
+    start = datetime.combine(today, datetime.min.time()).timestamp()
+    d = np.maximum((np.asarray(dues, dtype=float) - start) // DAY, 0).astype(np.int64)
+    return np.bincount(d[d < FORECAST_DAYS], minlength=FORECAST_DAYS).tolist()
+
+
+def weekly_accuracy(days, today):
+    """[(week start, reviews, accuracy %)] for the last WEEKS weeks, oldest first."""
+    first = today - timedelta(days=today.weekday() + 7 * (WEEKS - 1))
+    weeks = [[first + timedelta(weeks=i), 0, 0] for i in range(WEEKS)]
+    for day, ok, bad in days:
+        w = weeks[(date.fromisoformat(day) - first).days // 7]
+        w[1] += ok
+        w[2] += bad
+    return [(start.isoformat(), ok + bad, ok / (ok + bad) * 100 if ok + bad else None) for start, ok, bad in weeks]
+
+
+class Analytics:
+    """Per-user analytics, cached until the user's store version or the day changes."""
+
+    def __init__(self, store, events, max_users=256):
+        self.store, self.events = store, events
+        self.max_users = max_users
+        self.cache = OrderedDict()      # email -> (version, day, result)
+        self.lock = threading.Lock()
+
+    def summary(self, email, today=None):
+        today = today or date.today()
+        version = self.store.list_version(email)
+        with self.lock:
+            hit = self.cache.get(email)
+            if hit is not None and hit[:2] == (version, today):
+                self.cache.move_to_end(email)
+                return hit[2]
+        result = self.compute(email, today)
+        with self.lock:
+            self.cache[email] = (version, today, result)
+            self.cache.move_to_end(email)
+            while len(self.cache) > self.max_users:
+                self.cache.popitem(last=False)
+        return result
+
+    def compute(self, email, today):
+        decks = {d["id"]: d for d in self.store.list_decks(email)}
+        _, codes, ts, grades = load(self.events, email)
+        rated, dues = [], []
+        for deck_id in decks:
+            for card_id, (ok, bad, _) in self.store.get_card_totals(deck_id).items():
+                if ok + bad >= MIN_REVIEWS:
+                    rated.append((bad / (ok + bad), ok + bad, (deck_id, card_id)))
+            dues.extend(row[3] for row in self.store.schedules(email, deck_id))
+
+        rated.sort(reverse=True)
+        hardest, wanted = [], {}
+        for rate, n, (deck_id, card_id) in rated[:HARDEST * 2]:
+            wanted.setdefault(deck_id, []).append(card_id)
+        found = {}
+        for deck_id, ids in wanted.items():
+            for card_id, card in self.store.get_cards(email, deck_id, ids).items():
+                found[deck_id, card_id] = card
+        for rate, n, key in rated[:HARDEST * 2]:
+            if key in found and len(hardest) < HARDEST:
+                hardest.append({"deck": decks[key[0]], "card": found[key], "reviews": n, "error": rate * 100})
+
+        start = today - timedelta(days=today.weekday() + 7 * (WEEKS - 1))
+        return {
+            "reviews": len(ts),
+            "accuracy": weekly_accuracy(self.store.day_totals(email, start.isoformat(), today.isoformat()), today),
+            "retention": retention(codes, ts, grades),
+            "hardest": hardest,
+            "forecast": [((today + timedelta(days=i)).isoformat(), n) for i, n in enumerate(forecast(dues, today))],
+        }
@@ -0,0 +1,92 @@
+"""Fingerprinted static assets and response compression.
+
+Files in the static directory are read once at startup and served as
+`<stem>.<digest><ext>`, so their URLs change whenever their content does and
+browsers may cache them forever. Each file is compressed ahead of time with
+gzip, and with brotli when the `brotli` package is installed.
+"""
+import gzip, hashlib, mimetypes, os, zlib
+
+try:
+    import brotli
+except ImportError:     # gzip only
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+COMPRESSIBLE = {"text/html", "text/css", "text/plain", "text/csv", "application/javascript",
+                "text/javascript", "application/json", "application/x-ndjson"}
+MIN_SIZE = 512          # smaller bodies are not worth the header and CPU
+DYNAMIC_LEVEL = 6       # gzip level / brotli quality for per-request compression
+CODINGS = ("br", "gzip") if brotli else ("gzip",)
+
+
+def choose_coding(accept, size=MIN_SIZE, codings=CODINGS):
+    """Best of `codings` the client accepts (a Werkzeug Accept-Encoding header), or None."""
+    if size < MIN_SIZE:
+        return None
+    for coding in codings:
+        if accept[coding]:
+            return coding
+    return None
+
+
+def encode(data, coding, level=DYNAMIC_LEVEL):
+    if coding == "br":
+        return brotli.compress(data, quality=level)
+    if coding == "gzip":
+        return gzip.compress(data, level, mtime=0)
+    return data
+
+
+def gzip_stream(chunks, level=DYNAMIC_LEVEL):
+    """Gzip a streamed body piece by piece; each piece is flushed so the browser
+    can render it as soon as it arrives."""
+    z = zlib.compressobj(level, zlib.DEFLATED, 31)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            if chunk:
+                yield z.compress(chunk) + z.flush(zlib.Z_SYNC_FLUSH)
+        yield z.flush()
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+def tagged(etag, coding):
+    # Each encoding is a different byte sequence, so it needs its own strong ETag.
+    return f"{etag}-{coding}" if coding else etag
+
+
+class Assets:
+    def __init__(self, directory):
+        self.directory = directory
+        self.urls = {}      # source name -> fingerprinted name
+        self.files = {}     # fingerprinted name -> (mimetype, {coding or None: bytes})
+        digest = hashlib.blake2b(digest_size=8)
+        for name in sorted(os.listdir(directory)):
+            with open(os.path.join(directory, name), "rb") as f:
+                data = f.read()
+            stem, ext = os.path.splitext(name)
+            fingerprinted = f"{stem}.{hashlib.blake2b(data, digest_size=6).hexdigest()}{ext}"
+            variants = {None: data}
+            for coding in CODINGS:
+                variants[coding] = encode(data, coding, 11 if coding == "br" else 9)
+            mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            self.urls[name] = fingerprinted
+            self.files[fingerprinted] = (mimetype, variants)
+            digest.update(fingerprinted.encode())
+        self.version = digest.hexdigest()
+
+    def name(self, source):
+        return self.urls[source]
+
+    def get(self, fingerprinted, accept):
+        """(mimetype, coding, body) for the best variant the client accepts, or None."""
+        found = self.files.get(fingerprinted)
+        if found is None:
+            return None
+        mimetype, variants = found
+        coding = choose_coding(accept, len(variants[None]))
+        return mimetype, coding, variants[coding]
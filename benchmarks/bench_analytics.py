@@ -0,0 +1,64 @@
+"""Time to compute the stats page analytics for one user with many reviews.
+
+    python benchmarks/bench_analytics.py --reviews 1000000 --cards 20000
+
+Reviews are spread over the last 90 days in an in-memory event log, with
+other users' reviews logged alongside (--others users, as many reviews in
+all), and recorded in the store so its per-card totals are filled in too. Times
+one computation, then a cached lookup.
+"""
+import argparse, os, random, sys, time
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from analytics import Analytics  # noqa: E402
+from eventlog import EventLog, day_of  # noqa: E402
+from storage import MemoryStore  # noqa: E402
+
+EMAIL = "bench@example.com"
+BATCH = 10_000
+
+
+def fill(n_reviews, n_cards, n_others):
+    store, events = MemoryStore(), EventLog()
+    others = [f"other{i}@example.com" for i in range(n_others)]
+    store.add_user(EMAIL, "pw")
+    deck = store.add_deck(EMAIL, "bench", "")
+    store.add_cards(EMAIL, deck, [(f"front {j}", f"back {j}", "") for j in range(n_cards)])
+    ids = [row[0] for row in store.schedules(EMAIL, deck["id"])]
+    rng, start = random.Random(1), time.time() - 90 * 86400
+    times = sorted(start + rng.random() * 90 * 86400 for _ in range(n_reviews))
+    for done in range(0, n_reviews, BATCH):
+        grades = [(rng.choice(ids), "correct" if rng.random() < 0.8 else "incorrect", ts)
+                  for ts in times[done:done + BATCH]]
+        events.append(EMAIL, deck["id"], grades)
+        for i, email in enumerate(others):
+            events.append(email, "otherdk", grades[i::len(others)])
+        store.record_grades(EMAIL, deck, [(cid, grade, day_of(ts), (2.5, 1, ts + 86400, 1, ts))
+                                          for cid, grade, ts in grades])
+    return store, events
+
+
+def timed(fn):
+    t = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t) * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--reviews", type=int, default=1_000_000)
+    ap.add_argument("--cards", type=int, default=20_000)
+    ap.add_argument("--others", type=int, default=100)
+    args = ap.parse_args()
+
+    store, events = fill(args.reviews, args.cards, args.others)
+    today = date.today()
+    print(f"{args.reviews} reviews of {args.cards} cards over {len(events.days())} days")
+    a = Analytics(store, events)
+    print(f"  compute {timed(lambda: a.summary(EMAIL, today)):8.1f} ms"
+          f"  cached {timed(lambda: a.summary(EMAIL, today)):6.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Bytes per card held by MemoryStore, against the dict-per-card layout it replaced.
+
+    python benchmarks/bench_memory.py --cards 100000 --hints 13
+
+Memory is counted with tracemalloc while one deck is filled. "text" is what
+the front and back strings themselves take; everything above it is the
+store's own overhead (ids, indexes, schedules, containers).
+"""
+import argparse, os, sys, time, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from storage import MemoryStore, new_card, new_id  # noqa: E402
+
+EMAIL = "bench@example.com"
+
+
+def rows(n, n_hints):
+    for j in range(n):
+        # Fresh string objects, as a request or an import file would give.
+        yield f"front {j} term{j % 997}", f"back {j} answer{j % 991}", f"hint {j % n_hints}" if n_hints else ""
+
+
+class DictDeckStore:
+    """The previous MemoryStore card layout: a dict per card plus an order list."""
+
+    def __init__(self):
+        self.decks = {}
+
+    def add_deck(self):
+        d = {"id": new_id(), "n_cards": 0, "cards": {}, "order": []}
+        self.decks[d["id"]] = d
+        return d
+
+    def add_cards(self, deck, rows_):
+        for row in rows_:
+            card = new_card(*row)
+            card["pos"] = len(deck["order"])
+            deck["cards"][card["id"]] = card
+            deck["order"].append(card["id"])
+            deck["n_cards"] += 1
+
+
+def measure(fill):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    t = time.perf_counter()
+    keep = fill()
+    elapsed = time.perf_counter() - t
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del keep
+    return used, elapsed
+
+
+def fill_dicts(n, n_hints):
+    store = DictDeckStore()
+    store.add_cards(store.add_deck(), rows(n, n_hints))
+    return store
+
+
+def fill_columns(n, n_hints, batch=5000):
+    store = MemoryStore()
+    store.add_user(EMAIL, "pw")
+    deck = store.add_deck(EMAIL, "bench", "")
+    it = rows(n, n_hints)
+    while chunk := [r for _, r in zip(range(batch), it)]:
+        store.add_cards(EMAIL, deck, chunk)
+    return store
+
+
+def text_bytes(n, n_hints):
+    return sum(sys.getsizeof(front) + sys.getsizeof(back) for front, back, _ in rows(n, n_hints))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--cards", type=int, default=100_000)
+    ap.add_argument("--hints", type=int, default=13, help="distinct hint strings (0 = no hints)")
+    args = ap.parse_args()
+
+    n = args.cards
+    text = text_bytes(n, args.hints) / n
+    print(f"{n} cards, {args.hints} distinct hints; front+back text {text:.0f} B/card")
+    for name, fill in (("dict per card", fill_dicts), ("CardTable", fill_columns)):
+        used, elapsed = measure(lambda: fill(n, args.hints))
+        print(f"  {name:14} {used / n:7.0f} B/card  ({used / n - text:5.0f} overhead)"
+              f"  {used / 2**20:8.1f} MiB  built in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Latency and throughput for every FlipDeck route, through Flask's test client.
+
+    python benchmarks/bench_routes.py --sizes 1,1000,100000 --out bench.json
+    python benchmarks/bench_routes.py --baseline bench.json --fail-over 0.25
+
+Each size builds a fresh app with one user whose deck has that many cards.
+Cached pages are timed twice: as render-cache hits, and as ":uncached" with
+the cache emptied before each request.
+Results are written as JSON so runs can be compared across commits; with
+--baseline the run exits non-zero if any route's chosen percentile got
+worse than the baseline by more than --fail-over (a fraction).
+"""
+import argparse, importlib.util, itertools, json, os, platform, re, secrets, statistics, subprocess, sys, tempfile, time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+APP = os.path.join(ROOT, "First Milestone.py")
+EMAIL, PASSWORD = "bench@example.com", "pw"
+CARD_FIELD = re.compile(r'name="card" value="([^"]+)"')
+_loads = itertools.count()
+
+
+def load_app(db):
+    """Import a fresh copy of the app module, with its own store."""
+    if db:
+        os.environ["FLIPDECK_DB"] = db
+    else:
+        os.environ.pop("FLIPDECK_DB", None)
+    sys.path.insert(0, ROOT)
+    spec = importlib.util.spec_from_file_location(f"flipdeck_bench_{next(_loads)}", APP)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def populate(mod, n_cards, n_decks=20):
+    store = mod.store
+    store.add_user(EMAIL, PASSWORD)
+    main = None
+    for i in range(n_decks):
+        d = store.add_deck(EMAIL, f"Deck {i} #tag{i % 5}", f"synthetic deck {i}")
+        main = main or d
+    for start in range(0, n_cards, 5000):
+        rows = [(f"front {j} term{j % 997}", f"back {j} answer{j % 991}", f"hint{j % 13}" if j % 3 else "")
+                for j in range(start, min(n_cards, start + 5000))]
+        store.add_cards(EMAIL, main, rows)
+    first = next(store.iter_cards(EMAIL, main["id"], limit=1), None)
+    return main["id"], first["id"] if first else None
+
+
+def routes(deck_id, card_id):
+    """(name, method, url, form data or data-factory(client), needs login)."""
+    seq = itertools.count()
+
+    def review(action):
+        # Post the card the review page shows, as the browser does. Once nothing
+        # is due (a 1-card deck after one grade) post the first card: grading a
+        # card early takes the same path.
+        def form(client):
+            m = CARD_FIELD.search(client.get(f"/review/{deck_id}").get_data(as_text=True))
+            return {"action": action, "card": m.group(1) if m else card_id}
+        return form
+
+    return [
+        ("home", "GET", "/", None, False),
+        ("signup", "POST", "/signup", lambda client: {"email": f"u{next(seq)}@example.com", "password": "x"}, False),
+        ("login", "POST", "/login", {"email": EMAIL, "password": PASSWORD}, False),
+        ("decks_home", "GET", "/decks", None, True),
+        ("decks_home:uncached", "GET", "/decks", None, True),
+        ("decks_home?q", "GET", "/decks?q=term42", None, True),
+        ("decks_home?q:uncached", "GET", "/decks?q=term42", None, True),
+        ("deck_detail", "GET", f"/deck/{deck_id}", None, True),
+        ("deck_detail:uncached", "GET", f"/deck/{deck_id}", None, True),
+        ("add_card", "POST", f"/deck/{deck_id}/add",
+         # Random fronts, so every card is new and the duplicate check passes.
+         lambda client: {"front": f"bench {secrets.token_hex(8)}", "back": "bench back", "hint": ""}, True),
+        ("edit_card", "POST", f"/deck/{deck_id}/edit/{card_id}", {"front": "edited", "back": "edited back"}, True),
+        ("review_session:show", "POST", f"/review/{deck_id}", review("show"), True),
+        ("review_session:grade", "POST", f"/review/{deck_id}", review("correct"), True),
+        ("grade_stats", "GET", "/stats", None, True),
+        ("grade_stats:uncached", "GET", "/stats", None, True),
+    ]
+
+
+def measure(client, method, url, data, iterations, warmup, before=None):
+    """Time `iterations` requests; `before()` and data factories run outside the timing."""
+    def prepare():
+        if before:
+            before()
+        return data(client) if callable(data) else data
+
+    def call(form):
+        r = client.open(url, method=method, data=form)
+        r.get_data()
+        if r.status_code >= 400:
+            raise RuntimeError(f"{method} {url} -> {r.status_code}")
+
+    for _ in range(warmup):
+        call(prepare())
+    samples = []
+    elapsed = 0.0
+    for _ in range(iterations):
+        form = prepare()
+        t = time.perf_counter()
+        call(form)
+        samples.append((time.perf_counter() - t) * 1000)
+        elapsed += samples[-1] / 1000
+    q = statistics.quantiles(samples, n=100) if len(samples) > 1 else samples * 99
+    return {"p50_ms": round(q[49], 4), "p95_ms": round(q[94], 4), "p99_ms": round(q[98], 4),
+            "mean_ms": round(statistics.fmean(samples), 4), "rps": round(iterations / elapsed, 1), "n": iterations}
+
+
+def run_size(n_cards, args):
+    db = None
+    if args.db == "sqlite":
+        db = os.path.join(tempfile.mkdtemp(prefix="flipdeck-bench-"), "bench.db")
+    mod = load_app(db)
+    t = time.perf_counter()
+    deck_id, card_id = populate(mod, n_cards)
+    print(f"\n{n_cards} cards per deck ({args.db}); data built in {time.perf_counter() - t:.1f}s")
+    out = {}
+    for name, method, url, data, auth in routes(deck_id, card_id):
+        if args.only and name.split(":")[0].split("?")[0] not in args.only:
+            continue
+        client = mod.app.test_client()
+        if auth:
+            with client.session_transaction() as s:
+                s["user"] = EMAIL
+        before = mod.render_cache.clear if name.endswith(":uncached") else None
+        out[name] = res = measure(client, method, url, data, args.iterations, args.warmup, before)
+        print(f"  {name:22} p50 {res['p50_ms']:9.3f}  p95 {res['p95_ms']:9.3f}  p99 {res['p99_ms']:9.3f} ms"
+              f"  {res['rps']:9.1f} req/s")
+    return out
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def regressions(results, baseline, metric, threshold):
+    out = []
+    for size, routes_ in results.items():
+        for name, res in routes_.items():
+            old = baseline.get("results", {}).get(size, {}).get(name)
+            if old and old[metric] > 0 and res[metric] > old[metric] * (1 + threshold):
+                out.append(f"{size} cards {name}: {metric} {old[metric]:.3f} -> {res[metric]:.3f} ms")
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="1,1000,100000", help="cards per deck, comma separated")
+    ap.add_argument("--iterations", type=int, default=200)
+    ap.add_argument("--warmup", type=int, default=10)
+    ap.add_argument("--db", choices=["memory", "sqlite"], default="memory")
+    ap.add_argument("--only", type=lambda s: set(s.split(",")), help="comma separated route names")
+    ap.add_argument("--out", help="write results JSON here")
+    ap.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    ap.add_argument("--metric", default="p95_ms", choices=["p50_ms", "p95_ms", "p99_ms", "mean_ms"])
+    ap.add_argument("--fail-over", type=float, default=0.2, help="allowed slowdown vs baseline, e.g. 0.2 = 20%%")
+    args = ap.parse_args()
+
+    results = {str(n): run_size(int(n), args) for n in args.sizes.split(",")}
+    report = {"meta": {"commit": git_commit(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "python": platform.python_version(), "db": args.db,
+                       "iterations": args.iterations}, "results": results}
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nwrote {args.out}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        bad = regressions(results, baseline, args.metric, args.fail_over)
+        for line in bad:
+            print("REGRESSION", line)
+        if bad:
+            sys.exit(1)
+        print(f"no {args.metric} regressions over {args.fail_over:.0%} vs {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
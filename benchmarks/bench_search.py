@@ -0,0 +1,73 @@
+"""Compare the inverted search index with the old linear scan.
+
+    python benchmarks/bench_search.py --decks 200 --cards 100000
+"""
+import argparse, os, random, string, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from search import UserIndex, SearchIndex
+
+WORDS = ["".join(random.Random(i).choices(string.ascii_lowercase, k=random.Random(-i).randint(3, 10))) for i in range(20000)]
+
+
+def make_decks(n_decks, n_cards, seed=1):
+    rnd = random.Random(seed)
+    decks = []
+    for i in range(n_decks):
+        decks.append({"id": f"d{i}", "title": " ".join(rnd.choices(WORDS, k=3)) + f" #{rnd.choice(WORDS)}",
+                      "desc": " ".join(rnd.choices(WORDS, k=8)), "n_cards": 0, "cards": []})
+    for j in range(n_cards):
+        d = decks[j % n_decks]
+        d["cards"].append({"id": f"c{j}", "front": " ".join(rnd.choices(WORDS, k=6)),
+                           "back": " ".join(rnd.choices(WORDS, k=10)), "hint": rnd.choice(WORDS)})
+        d["n_cards"] += 1
+    return decks
+
+
+def title_scan(decks, q):
+    return [d for d in decks if q in d["title"].lower()]
+
+
+def full_scan(decks, q):
+    return [d for d in decks if q in d["title"].lower() or q in d["desc"].lower()
+            or any(q in c["front"].lower() or q in c["back"].lower() or q in c["hint"].lower() for c in d["cards"])]
+
+
+def timed(fn, queries, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        for q in queries:
+            fn(q)
+        best = min(best, time.perf_counter() - t)
+    return best / len(queries) * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--decks", type=int, default=200)
+    ap.add_argument("--cards", type=int, default=100000)
+    ap.add_argument("--queries", type=int, default=50)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    decks = make_decks(args.decks, args.cards)
+    rnd = random.Random(2)
+    queries = [rnd.choice(WORDS)[:rnd.randint(3, 6)] for _ in range(args.queries)]
+
+    t = time.perf_counter()
+    ix = UserIndex()
+    for d in decks:
+        ix.put(d["id"], None, SearchIndex.deck_terms(d))
+        for c in d["cards"]:
+            ix.put(d["id"], c["id"], SearchIndex.card_terms(c))
+    build = time.perf_counter() - t
+
+    print(f"{args.decks} decks, {args.cards} cards, {len(ix.vocab)} terms; index built in {build:.2f}s")
+    print(f"title scan (old)    {timed(lambda q: title_scan(decks, q), queries, args.repeat):9.3f} ms/query")
+    print(f"full-text scan      {timed(lambda q: full_scan(decks, q), queries, 1):9.3f} ms/query")
+    print(f"inverted index      {timed(ix.search, queries, args.repeat):9.3f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Bounded LRU cache for rendered response bodies."""
+from collections import OrderedDict
+import threading
+
+
+class LRUCache:
+    """Evicts least-recently-used entries past `max_items` or `max_bytes` of values."""
+
+    def __init__(self, max_items=2048, max_bytes=64 * 1024 * 1024):
+        self.max_items, self.max_bytes = max_items, max_bytes
+        self.data = OrderedDict()
+        self.bytes = 0
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.data.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old)
+            self.data[key] = value
+            self.bytes += size
+            while len(self.data) > self.max_items or self.bytes > self.max_bytes:
+                _, evicted = self.data.popitem(last=False)
+                self.bytes -= len(evicted)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self.data)
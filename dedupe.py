@@ -0,0 +1,299 @@
+"""Duplicate and near-duplicate card detection.
+
+Exact duplicates share a hash of their normalised front and back. Near
+duplicates are found with MinHash over character shingles and LSH banding
+of the front: two cards that agree on every row of some band become
+candidates, and only candidates are compared. The two sides are compared
+separately and a pair must be similar on both, so "What year did WW1
+start? / 1914" and "... WW2 start? / 1939" are not duplicates, however
+alike the questions read. The signature is a one-permutation MinHash (one
+hash per shingle, split into bins), which is an order of magnitude cheaper
+in Python than one hash per shingle per permutation. Short texts leave many
+bins empty; each borrows from a bin picked by its own probe sequence, so
+neighbouring empty bins borrow from different shingles and a band is never
+decided by a single shingle the two texts happen to share.
+
+A DeckIndex holds the exact hashes and band buckets of one deck, so a new
+card is checked against it in O(1) expected time. It is caught up from the
+store by the deck's text_version, reading only cards added or edited since;
+reviews do not touch it. Only the `max_decks` most recently used indexes are kept.
+"""
+from collections import OrderedDict
+import re, threading, unicodedata, zlib
+
+SHINGLE = 3
+BIN_BITS = 6
+BINS = 1 << BIN_BITS        # signature length
+BANDS, ROWS = 16, 4         # candidates from about (1/BANDS) ** (1/ROWS) = 0.5 similarity
+THRESHOLD = 0.6             # Jaccard similarity reported as a near duplicate
+MAX_GROUPS = 500            # groups kept in a deck report
+
+VALUE_BITS = 64 - BIN_BITS
+VALUE_MASK = (1 << VALUE_BITS) - 1
+EMPTY = 1 << VALUE_BITS
+PROBE = 0xC2B2AE3D27D4EB4F  # odd multiplier for an empty bin's probe sequence
+MIX = 0x9E3779B97F4A7C15
+MASK64 = (1 << 64) - 1
+WORD = re.compile(r"\w+")
+
+
+def normalize(text):
+    return " ".join(WORD.findall(unicodedata.normalize("NFKC", text or "").casefold()))
+
+
+def texts(front, back):
+    return normalize(front), normalize(back)
+
+
+def exact_key(norm):
+    return hash(norm)
+
+
+def shingles(text):
+    if len(text) <= SHINGLE:
+        return {zlib.crc32(text.encode())}
+    return {zlib.crc32(text[i:i + SHINGLE].encode()) for i in range(len(text) - SHINGLE + 1)}
+
+
+def signature(sh):
+    sig = [EMPTY] * BINS
+    for x in sh:
+        h = (x * MIX) & MASK64
+        b, v = h >> VALUE_BITS, h & VALUE_MASK
+        if v < sig[b]:
+            sig[b] = v
+    if EMPTY in sig:
+        src = sig[:]
+        for i in range(BINS):
+            attempt = 0
+            while src[i] == EMPTY and sig[i] == EMPTY:
+                attempt += 1
+                j = (((i + 1) * MIX + attempt * PROBE) & MASK64) >> VALUE_BITS
+                if src[j] != EMPTY:
+                    sig[i] = src[j] + attempt
+    return sig
+
+
+def band_keys(sig):
+    return [hash((b, *sig[b * ROWS:(b + 1) * ROWS])) for b in range(BANDS)]
+
+
+def estimate(sig_a, sig_b):
+    return sum(a == b for a, b in zip(sig_a, sig_b)) / BINS
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def similarity(a, b):
+    """Similarity of two normalised cards: the lower of the two sides' Jaccard."""
+    if a == b:
+        return 1.0
+    return min(jaccard(shingles(a[0]), shingles(b[0])), jaccard(shingles(a[1]), shingles(b[1])))
+
+
+def put(table, key, card_id):
+    # Most buckets hold one card, so a lone id is stored bare rather than in a list.
+    cur = table.get(key)
+    if cur is None:
+        table[key] = card_id
+    elif isinstance(cur, list):
+        cur.append(card_id)
+    else:
+        table[key] = [cur, card_id]
+
+
+def drop(table, key, card_id):
+    cur = table.get(key)
+    if cur == card_id:
+        del table[key]
+    elif isinstance(cur, list) and card_id in cur:
+        cur.remove(card_id)
+        if len(cur) == 1:
+            table[key] = cur[0]
+
+
+def members(table, key):
+    cur = table.get(key)
+    return [] if cur is None else cur if isinstance(cur, list) else [cur]
+
+
+class DeckIndex:
+    def __init__(self):
+        self.exact = {}         # exact key -> card id(s)
+        self.buckets = {}       # band key of the front -> card id(s)
+        self.norms = {}         # card id -> normalised (front, back), to unindex an edit
+        self.seen = -1          # deck text_version indexed
+
+    def add(self, card_id, norm, sig=None):
+        old = self.norms.get(card_id)
+        if old is not None:
+            self.remove(card_id, old)
+        self.norms[card_id] = norm
+        put(self.exact, exact_key(norm), card_id)
+        for k in band_keys(sig or signature(shingles(norm[0]))):
+            put(self.buckets, k, card_id)
+
+    def remove(self, card_id, norm):
+        del self.norms[card_id]
+        drop(self.exact, exact_key(norm), card_id)
+        for k in band_keys(signature(shingles(norm[0]))):
+            drop(self.buckets, k, card_id)
+
+    def candidates(self, norm):
+        """(exact ids, other ids sharing a band of the front) for a card's normalised text."""
+        exact = members(self.exact, exact_key(norm))
+        near = {cid for k in band_keys(signature(shingles(norm[0]))) for cid in members(self.buckets, k)}
+        return exact, near.difference(exact)
+
+
+class Dedupe:
+    """One DeckIndex per (email, deck_id), built from the store on first use,
+    then caught up with cards added or edited since, on any worker."""
+
+    def __init__(self, store, max_decks=64):
+        self.store = store
+        self.max_decks = max_decks
+        self.decks = OrderedDict()      # (email, deck_id) -> DeckIndex, least recently used first
+        self.warming = set()
+        self.lock = threading.Lock()
+
+    def keep(self, key, ix):
+        """Store `ix` unless another thread got there first; returns the kept index."""
+        ix = self.decks.setdefault(key, ix)
+        self.decks.move_to_end(key)
+        while len(self.decks) > self.max_decks:
+            self.decks.popitem(last=False)
+        return ix
+
+    def index(self, email, deck):
+        key, version = (email, deck["id"]), deck["text_version"]
+        with self.lock:
+            ix = self.decks.get(key)
+            if ix is not None:
+                self.decks.move_to_end(key)
+                if ix.seen == version:
+                    return ix
+        if ix is None:
+            ix = DeckIndex()
+            for card in self.store.iter_cards(email, deck["id"]):
+                ix.add(card["id"], texts(card["front"], card["back"]))
+            ix.seen = version
+            with self.lock:
+                ix = self.keep(key, ix)
+        with self.lock:
+            if ix.seen < version:
+                for card in self.store.edited_cards(email, deck["id"], ix.seen):
+                    ix.add(card["id"], texts(card["front"], card["back"]))
+                ix.seen = version
+        return ix
+
+    def warm(self, email, deck):
+        """Build the deck's index on a background thread if there is none yet,
+        so the first card saved does not wait for a full read of the deck."""
+        key = (email, deck["id"])
+        with self.lock:
+            if key in self.decks or key in self.warming:
+                return
+            self.warming.add(key)
+        threading.Thread(target=self._warm, args=(email, deck), daemon=True).start()
+
+    def _warm(self, email, deck):
+        try:
+            self.index(email, deck)
+        finally:
+            self.warming.discard((email, deck["id"]))
+
+    def check(self, email, deck, front, back, exclude=None, limit=5):
+        """Cards in `deck` that duplicate front/back, as [(similarity, card)] best first."""
+        norm = texts(front, back)
+        ix = self.index(email, deck)
+        with self.lock:
+            exact, near = ix.candidates(norm)
+        ids = [cid for cid in (*exact, *near) if cid != exclude]
+        cards = self.store.get_cards(email, deck["id"], ids) if ids else {}
+        out = []
+        for cid, card in cards.items():
+            sim = similarity(norm, texts(card["front"], card["back"]))
+            if sim >= THRESHOLD:
+                out.append((sim, card))
+        out.sort(key=lambda x: -x[0])
+        return out[:limit]
+
+    def report(self, email, deck, progress=None):
+        """Duplicate groups in a deck, as [{"kind": "exact"|"near", "similarity", "ids"}].
+
+        Reads the deck once, refreshes the deck's index from that pass, and
+        only compares cards that share an exact hash or an LSH band of the front.
+        `progress(fraction)` is called every thousand cards.
+        """
+        ix, sigs, backs, exact_of = DeckIndex(), {}, {}, {}
+        ix.seen = deck["text_version"]
+        total = max(deck["n_cards"], 1)
+        for i, card in enumerate(self.store.iter_cards(email, deck["id"]), 1):
+            norm = texts(card["front"], card["back"])
+            sigs[card["id"]] = sig = signature(shingles(norm[0]))
+            backs[card["id"]] = signature(shingles(norm[1]))
+            exact_of[card["id"]] = exact_key(norm)
+            ix.add(card["id"], norm, sig)
+            if progress and i % 1000 == 0:
+                progress(i / total)
+        with self.lock:
+            self.decks.pop((email, deck["id"]), None)
+            self.keep((email, deck["id"]), ix)
+
+        def close(a, b):
+            return min(estimate(sigs[a], sigs[b]), estimate(backs[a], backs[b]))
+
+        parent, size = {}, {}
+
+        def find(x):
+            root = x
+            while parent[root] != root:
+                root = parent[root]
+            while x != root:
+                parent[x], x = root, parent[x]
+            return root
+
+        def union(a, b):
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[rb] = ra
+                size[ra] += size.pop(rb)
+
+        for cid in sigs:
+            parent[cid], size[cid] = cid, 1
+        for ids in ix.exact.values():
+            if isinstance(ids, list):
+                for cid in ids[1:]:
+                    union(ids[0], cid)
+        # Near duplicates form stars: a card joins a group only if it is close
+        # to the group's root, so a chain of small edits never links two
+        # unrelated cards. Each bucket member is compared with the bucket's
+        # first card only, so a bucket costs linear time however full it is.
+        for ids in ix.buckets.values():
+            if isinstance(ids, list):
+                for cid in ids[1:]:
+                    ra, rc = find(ids[0]), find(cid)
+                    if ra == rc:
+                        continue
+                    if size[rc] == 1 and close(ra, cid) >= THRESHOLD:
+                        union(ra, rc)
+                    elif size[ra] == 1 and close(rc, ids[0]) >= THRESHOLD:
+                        union(rc, ra)
+
+        groups = {}
+        for cid in sigs:
+            groups.setdefault(find(cid), []).append(cid)
+        out = []
+        for root, ids in groups.items():
+            if len(ids) < 2:
+                continue
+            if len({exact_of[c] for c in ids}) == 1:
+                out.append({"kind": "exact", "similarity": 1.0, "ids": ids})
+            else:
+                sim = min(close(root, c) for c in ids if c != root)
+                out.append({"kind": "near", "similarity": sim, "ids": ids})
+        out.sort(key=lambda g: (g["kind"] != "exact", -len(g["ids"]), -g["similarity"]))
+        return out[:MAX_GROUPS]
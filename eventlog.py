@@ -0,0 +1,120 @@
+"""Append-only review event log.
+
+Every applied grade becomes one fixed-size binary record in a per-day
+segment (`events-YYYY-MM-DD-SS.bin`):
+
+    ts f64 | user 8B (blake2b of email) | deck_id 8B | card_id 16B | grade u8
+
+Each day is split into SHARDS segments by the user's key, so reading one
+user's reviews reads 1/SHARDS of the log. Segments live on disk when a directory is given, otherwise in memory.
+Daily, per-deck and per-card totals are rolled up by the store at write
+time, so segments past the retention window are simply removed by compact().
+"""
+from datetime import date, datetime
+import fcntl, hashlib, os, re, struct, threading
+
+RECORD = struct.Struct("<d8s8s16sB")
+GRADE_CODES = {"incorrect": 0, "correct": 1}
+SHARDS = 64
+SEGMENT = re.compile(r"events-(\d{4}-\d{2}-\d{2})-\d{2}\.bin")
+
+
+def user_key(email):
+    return hashlib.blake2b(email.encode(), digest_size=8).digest()
+
+
+def shard_of(user):
+    return user[0] % SHARDS
+
+
+def day_of(ts):
+    return datetime.fromtimestamp(ts).date().isoformat()
+
+
+class EventLog:
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.mem = {}       # (day, shard) -> bytearray when there is no directory
+        self.lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def path(self, day, shard):
+        return os.path.join(self.directory, f"events-{day}-{shard:02d}.bin")
+
+    def append(self, email, deck_id, grades):
+        """Log [(card_id, grade, ts)] for one user and deck."""
+        by_day = {}
+        user, deck = user_key(email), deck_id.encode()
+        shard = shard_of(user)
+        for card_id, grade, ts in grades:
+            by_day.setdefault(day_of(ts), bytearray()).extend(
+                RECORD.pack(ts, user, deck, card_id.encode(), GRADE_CODES[grade]))
+        for day, buf in by_day.items():
+            if self.directory:
+                # One write per segment; O_APPEND keeps concurrent workers' records whole.
+                fd = os.open(self.path(day, shard), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, buf)
+                finally:
+                    os.close(fd)
+            else:
+                with self.lock:
+                    self.mem.setdefault((day, shard), bytearray()).extend(buf)
+
+    def days(self):
+        if not self.directory:
+            return sorted({day for day, _ in self.mem})
+        return sorted({m[1] for m in map(SEGMENT.fullmatch, os.listdir(self.directory)) if m})
+
+    def segment(self, day, shard):
+        if self.directory:
+            try:
+                with open(self.path(day, shard), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                return b""
+        else:
+            data = bytes(self.mem.get((day, shard), b""))
+        usable = len(data) - len(data) % RECORD.size    # ignore a torn tail from a crashed writer
+        return data[:usable]
+
+    def raw(self, day, email=None):
+        """One day's records as bytes, whole records only. With `email`, only
+        the user's shard is read; it may hold other users' records too."""
+        shards = [shard_of(user_key(email))] if email else range(SHARDS)
+        return b"".join(self.segment(day, shard) for shard in shards)
+
+    def compact(self, before):
+        """Drop every segment older than `before` (a date).
+
+        Returns the days dropped. Across processes only one compactor runs
+        at a time; the others return immediately.
+        """
+        with self.lock:
+            lock_fd = None
+            if self.directory:
+                lock_fd = os.open(os.path.join(self.directory, "compact.lock"), os.O_WRONLY | os.O_CREAT, 0o644)
+                try:
+                    fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    os.close(lock_fd)
+                    return []
+            try:
+                done = []
+                for day in self.days():
+                    if date.fromisoformat(day) >= before:
+                        break
+                    for shard in range(SHARDS):
+                        if self.directory:
+                            try:
+                                os.remove(self.path(day, shard))
+                            except FileNotFoundError:
+                                pass
+                        else:
+                            self.mem.pop((day, shard), None)
+                    done.append(day)
+                return done
+            finally:
+                if lock_fd is not None:
+                    os.close(lock_fd)
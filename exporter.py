@@ -0,0 +1,81 @@
+"""Streaming deck and account export (NDJSON and CSV).
+
+Cards are read a page at a time through the store's position cursor and
+written out in chunks of about CHUNK bytes, so memory stays flat however big
+the account is and a SQLite read never stays open across a slow download.
+
+NDJSON holds one record per line, `{"type": "deck"|"card"|"stats"|"account", ...}`.
+It keeps schedules and stats, and importer.restore_account() reads it back.
+CSV holds front,back,hint and imports into any deck through the CSV importer.
+"""
+import csv, io, json, time
+
+PAGE = 1000             # cards per store read
+CHUNK = 64 * 1024       # bytes per write
+FORMAT_VERSION = 1
+CARD_FIELDS = ("front", "back", "hint", "ease", "interval", "due", "reps", "last")
+MIMETYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def cards(store, email, deck_id, page=PAGE):
+    after = -1
+    while True:
+        batch = list(store.iter_cards(email, deck_id, after, page))
+        yield from batch
+        if len(batch) < page:
+            return
+        after = batch[-1]["pos"]
+
+
+def chunked(pieces, size=CHUNK):
+    buf, n = [], 0
+    for piece in pieces:
+        buf.append(piece)
+        n += len(piece)
+        if n >= size:
+            yield "".join(buf)
+            buf, n = [], 0
+    if buf:
+        yield "".join(buf)
+
+
+def record(kind, **fields):
+    return json.dumps({"type": kind, **fields}, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def deck_records(store, email, deck):
+    yield record("deck", id=deck["id"], title=deck["title"], desc=deck["desc"])
+    for card in cards(store, email, deck["id"]):
+        yield record("card", **{k: card[k] for k in CARD_FIELDS})
+
+
+def account_records(store, email):
+    yield record("account", version=FORMAT_VERSION, exported=time.time())
+    for deck in store.list_decks(email):
+        yield from deck_records(store, email, deck)
+    s = store.get_stats(email)
+    yield record("stats", streak=s["streak"], last_day=s["last_day"], by_deck=dict(s["by_deck"]),
+                 daily=store.day_totals(email, "0000-01-01", "9999-12-31"))
+
+
+def csv_rows(store, email, deck):
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(("front", "back", "hint"))
+    for card in cards(store, email, deck["id"]):
+        w.writerow((card["front"], card["back"], card["hint"]))
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    yield buf.getvalue()
+
+
+def export_deck(store, email, deck, fmt):
+    """Chunks of a deck export in `fmt` ("ndjson" or "csv")."""
+    rows = csv_rows(store, email, deck) if fmt == "csv" else deck_records(store, email, deck)
+    return chunked(rows)
+
+
+def export_account(store, email):
+    """Chunks of an NDJSON backup of every deck, card and stat the user has."""
+    return chunked(account_records(store, email))
@@ -0,0 +1,228 @@
+"""Streaming bulk card import (CSV, TSV, Anki-style tab-separated text and
+FlipDeck NDJSON exports), plus whole-account restore from an NDJSON backup.
+
+The upload is read line by line and inserted in batches, so memory stays
+flat no matter how big the file is. import_cards() and restore_account()
+yield progress events for the result page to render as they happen.
+Gzipped uploads are unpacked on the fly.
+"""
+import csv, gzip, io, json, shutil, tempfile
+
+BATCH = 1000
+MAX_ERRORS = 100     # rows with errors reported back; the rest are only counted
+FORMATS = {"csv": ",", "tsv": "\t", "anki": "\t", "ndjson": None}
+EXTENSIONS = {".csv": "csv", ".tsv": "tsv", ".txt": "anki", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+HEADERS = {("front", "back"), ("question", "answer")}
+
+
+def guess_format(filename, fmt=None):
+    if fmt in FORMATS:
+        return fmt
+    name = (filename or "").lower().removesuffix(".gz")
+    for ext, f in EXTENSIONS.items():
+        if name.endswith(ext):
+            return f
+    return "csv"
+
+
+def spool(upload):
+    """Copy an upload to a private temp file.
+
+    Werkzeug closes request files when the view returns, before a streamed
+    response has been consumed.
+    """
+    tmp = tempfile.TemporaryFile()
+    shutil.copyfileobj(upload.stream, tmp, 64 * 1024)
+    tmp.seek(0)
+    return tmp
+
+
+def unpacked(stream):
+    """The stream itself, or a reader over its contents if it is gzipped."""
+    magic = stream.read(2)
+    stream.seek(0)
+    return gzip.GzipFile(fileobj=stream) if magic == b"\x1f\x8b" else stream
+
+
+def rows(stream, fmt):
+    """Yield (line_no, fields) from a binary stream; fields is None for a row
+    the csv module cannot read, such as one with a field over its size limit."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline="")
+    line_no = 0
+
+    def lines():
+        nonlocal line_no
+        for line in text:
+            line_no += 1
+            # Anki exports start with "#separator:tab"-style directives.
+            if fmt == "anki" and line.startswith("#"):
+                continue
+            yield line
+
+    reader = csv.reader(lines(), delimiter=FORMATS[fmt])
+    while True:
+        try:
+            fields = next(reader)
+        except StopIteration:
+            return
+        except csv.Error:
+            # The reader starts afresh on the next line.
+            yield line_no, None
+            continue
+        if not fields or not any(f.strip() for f in fields):
+            continue
+        if reader.line_num == 1 and tuple(f.strip().lower() for f in fields[:2]) in HEADERS:
+            continue
+        yield line_no, fields
+
+
+def validate(fields):
+    """Same rules as the single-card form: front and back required, hint optional."""
+    if fields is None:
+        return None, "Unreadable row (a field is too long or badly quoted)."
+    front = fields[0].strip() if len(fields) > 0 else ""
+    back = fields[1].strip() if len(fields) > 1 else ""
+    hint = fields[2].strip() if len(fields) > 2 else ""
+    if not front or not back:
+        return None, "Front and Back are required."
+    return (front, back, hint), None
+
+
+def records(stream):
+    """Yield (line_no, record) from NDJSON; record is None for a line that is not a JSON object."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace")
+    for line_no, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            rec = None
+        yield line_no, rec if isinstance(rec, dict) else None
+
+
+def card_record(rec):
+    """validate() for an NDJSON card; a full export record also carries its schedule."""
+    if rec is None:
+        return None, "Not a JSON object."
+    row, err = validate([str(rec.get(k) or "") for k in ("front", "back", "hint")])
+    if err or "ease" not in rec:
+        return row, err
+    try:
+        sched = (float(rec["ease"]), float(rec["interval"]), float(rec["due"]), int(rec["reps"]), float(rec["last"]))
+    except (KeyError, TypeError, ValueError):
+        return None, "Bad schedule values."
+    return row + sched, None
+
+
+def card_rows(stream, fmt):
+    """Yield (line_no, row, error) for every card line of an upload."""
+    if fmt == "ndjson":
+        for line_no, rec in records(stream):
+            # Deck, stats and account lines of an export have nothing to add to one deck.
+            if rec is None or rec.get("type", "card") == "card":
+                yield line_no, *card_record(rec)
+    else:
+        for line_no, fields in rows(stream, fmt):
+            yield line_no, *validate(fields)
+
+
+def import_cards(store, email, deck, stream, fmt, saved=None, batch=BATCH):
+    """Insert every valid row and yield progress/error/done events.
+
+    `saved(cards)` is called after each batch so indexes can catch up.
+    The stream is closed once the import finishes.
+    """
+    with stream:
+        yield from _import(store, email, deck, unpacked(stream), fmt, saved, batch)
+
+
+def _import(store, email, deck, stream, fmt, saved, batch):
+    pending, imported, failed = [], 0, 0
+
+    def flush():
+        nonlocal imported
+        cards = store.add_cards(email, deck, pending)
+        if saved:
+            saved(cards)
+        imported += len(cards)
+        pending.clear()
+
+    line_no = 0
+    for line_no, row, err in card_rows(stream, fmt):
+        if err:
+            failed += 1
+            if failed <= MAX_ERRORS:
+                yield {"kind": "error", "line": line_no, "msg": err}
+            continue
+        pending.append(row)
+        if len(pending) >= batch:
+            flush()
+            yield {"kind": "progress", "imported": imported, "line": line_no}
+    if pending:
+        flush()
+    yield {"kind": "done", "imported": imported, "failed": failed, "lines": line_no}
+
+
+def restore_account(store, email, stream, saved=None, batch=BATCH):
+    """Recreate the decks, cards and stats of an NDJSON account backup.
+
+    Decks get new ids; stats are merged into the user's own. Yields the same
+    events as import_cards(), plus {"kind": "deck", "title"} per deck.
+    `saved(deck, cards)` is called after each batch so indexes can catch up.
+    """
+    with stream:
+        yield from _restore(store, email, unpacked(stream), saved, batch)
+
+
+def _restore(store, email, stream, saved, batch):
+    deck, ids, pending = None, {}, []
+    imported = failed = decks = 0
+
+    def flush():
+        nonlocal imported
+        cards = store.add_cards(email, deck, pending)
+        if saved:
+            saved(deck, cards)
+        imported += len(cards)
+        pending.clear()
+
+    def error(line_no, msg):
+        nonlocal failed
+        failed += 1
+        return [{"kind": "error", "line": line_no, "msg": msg}] if failed <= MAX_ERRORS else []
+
+    line_no = 0
+    for line_no, rec in records(stream):
+        kind = rec.get("type") if rec else None
+        if kind == "card":
+            row, err = card_record(rec)
+            if deck is None:
+                err = "Card before any deck."
+            if err:
+                yield from error(line_no, err)
+                continue
+            pending.append(row)
+            if len(pending) >= batch:
+                flush()
+                yield {"kind": "progress", "imported": imported, "line": line_no}
+        elif kind == "deck":
+            if pending:
+                flush()
+            title = str(rec.get("title") or "").strip() or "Untitled deck"
+            deck = store.add_deck(email, title, str(rec.get("desc") or "").strip())
+            ids[rec.get("id")] = deck["id"]
+            decks += 1
+            yield {"kind": "deck", "title": title}
+        elif kind == "stats":
+            try:
+                daily = [(str(day), int(ok), int(bad)) for day, ok, bad in rec.get("daily") or []]
+                by_deck = {ids[k]: int(n) for k, n in (rec.get("by_deck") or {}).items() if k in ids}
+                store.restore_stats(email, int(rec.get("streak") or 0), rec.get("last_day"), daily, by_deck)
+            except (AttributeError, TypeError, ValueError):
+                yield from error(line_no, "Bad stats record.")
+        elif kind != "account":
+            yield from error(line_no, "Not a FlipDeck backup record.")
+    if pending:
+        flush()
+    yield {"kind": "done", "imported": imported, "failed": failed, "decks": decks, "lines": line_no}
@@ -0,0 +1,229 @@
+"""Background jobs for whole-deck work (import, export, restore).
+
+Jobs run on a small thread pool so the request that starts one returns at
+once; the browser then polls /jobs/<id>. At most `max_queued` jobs wait for
+a thread, and a user may have `per_owner` unfinished jobs.
+
+Each job is a row in a `jobs` table of the app's SQLite database (or of a
+private in-memory one), so whichever worker serves the status page, the
+cancel button or the download sees the job: its progress, notes, result and
+the path of any file it produced. A running job writes its progress back at
+most every SYNC_EVERY seconds and picks up cancel requests at the same time.
+Jobs left unfinished by a worker that exited are marked failed. Finished jobs
+are forgotten after `keep` seconds, together with any file they produced.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import json, os, secrets, sqlite3, time, traceback
+
+from sessions import ConnectionPool
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = {DONE, FAILED, CANCELLED}
+MAX_NOTES = 100     # messages kept per job
+SYNC_EVERY = 0.5    # seconds between progress writes of a running job
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+  id TEXT PRIMARY KEY,
+  owner TEXT NOT NULL,
+  kind TEXT NOT NULL,
+  title TEXT NOT NULL,
+  back TEXT,
+  state TEXT NOT NULL,
+  progress REAL NOT NULL DEFAULT 0,
+  summary TEXT NOT NULL DEFAULT '',
+  notes TEXT NOT NULL DEFAULT '[]',
+  file TEXT,
+  link TEXT,
+  result TEXT,
+  error TEXT,
+  created REAL NOT NULL,
+  finished REAL,
+  cancel INTEGER NOT NULL DEFAULT 0,
+  pid INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+# Columns a running job writes back; file, link and result are JSON.
+SYNCED = ("state", "progress", "summary", "notes", "file", "link", "result", "error", "finished")
+JSON_COLS = {"notes", "file", "link", "result"}
+
+
+class Busy(Exception):
+    """Too many jobs are waiting; try again later."""
+
+
+class Cancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, owner, kind, title, back=None):
+        self.id = secrets.token_hex(8)
+        self.owner, self.kind, self.title = owner, kind, title
+        self.back = back        # where the status page links back to
+        self.state, self.progress = QUEUED, 0.0
+        self.notes = []         # [(css class, text)]
+        self.summary = ""       # one line for the status page, kept current by the job
+        self.file = None        # (path, download name, mimetype) for jobs that build a file
+        self.link = None        # (label, url) offered once the job is done
+        self.result = None      # what the job function returned
+        self.error = None
+        self.created, self.finished = time.time(), None
+        self.cancel_requested = False
+        self.runner, self.synced = None, 0.0
+
+    @classmethod
+    def from_row(cls, row):
+        job = cls.__new__(cls)
+        for name in ("id", "owner", "kind", "title", "back", "state", "progress", "summary", "error",
+                     "created", "finished"):
+            setattr(job, name, row[name])
+        for name in JSON_COLS:
+            setattr(job, name, json.loads(row[name]) if row[name] is not None else None)
+        job.cancel_requested, job.runner, job.synced = bool(row["cancel"]), None, 0.0
+        return job
+
+    def update(self, progress=None):
+        """Record progress (0..1); raises Cancelled once cancel() was asked for."""
+        if progress is not None:
+            self.progress = min(max(progress, 0.0), 1.0)
+        if self.runner is not None and time.monotonic() - self.synced >= SYNC_EVERY:
+            self.runner.sync(self)
+        if self.cancel_requested:
+            raise Cancelled()
+
+    def note(self, text, cls=""):
+        if len(self.notes) < MAX_NOTES:
+            self.notes.append((cls, text))
+
+    def as_dict(self):
+        return {"id": self.id, "kind": self.kind, "title": self.title, "state": self.state,
+                "progress": round(self.progress * 100, 1), "summary": self.summary, "error": self.error,
+                "download": self.state == DONE and self.file is not None}
+
+
+class JobRunner:
+    """`path` is the SQLite file holding the job table; None or "memory" keeps it in memory."""
+
+    def __init__(self, workers=2, path=None, max_queued=32, per_owner=4, keep=3600):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.max_queued, self.per_owner, self.keep = max_queued, per_owner, keep
+        if path and path != "memory":
+            path = path.removeprefix("sqlite:///")
+            self.db = ConnectionPool(lambda: self.open(path))
+        else:
+            uri = f"file:jobs-{secrets.token_hex(8)}?mode=memory&cache=shared"
+            self.db = ConnectionPool(lambda: self.open(uri, uri=True))
+        with self.db.connection() as c:
+            c.executescript(SCHEMA)
+
+    @staticmethod
+    def open(path, uri=False):
+        c = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None, uri=uri)
+        c.row_factory = sqlite3.Row
+        if not uri:
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+        return c
+
+    def submit(self, owner, kind, title, fn, *args, back=None):
+        """Queue fn(job, *args) and return the Job, or raise Busy."""
+        job = Job(owner, kind, title, back)
+        with self.db.connection() as c:
+            self.prune(c)
+            c.execute("BEGIN IMMEDIATE")    # the limits hold across workers
+            try:
+                queued, mine = c.execute(
+                    "SELECT count(*) FILTER (WHERE state = ?), count(*) FILTER (WHERE owner = ?) "
+                    "FROM jobs WHERE state IN (?, ?)", (QUEUED, owner, QUEUED, RUNNING)).fetchone()
+                if queued >= self.max_queued or mine >= self.per_owner:
+                    raise Busy()
+                c.execute("INSERT INTO jobs (id, owner, kind, title, back, state, created, pid) "
+                          "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                          (job.id, owner, kind, title, back, job.state, job.created, os.getpid()))
+                c.execute("COMMIT")
+            except BaseException:
+                c.execute("ROLLBACK")
+                raise
+        job.runner = self
+        self.pool.submit(self.run, job, fn, args)
+        return job
+
+    def sync(self, job):
+        """Write the job's progress to its row and read back any cancel request."""
+        job.synced = time.monotonic()
+        values = [json.dumps(getattr(job, name)) if name in JSON_COLS else getattr(job, name) for name in SYNCED]
+        with self.db.connection() as c:
+            row = c.execute(f"UPDATE jobs SET {', '.join(f'{n} = ?' for n in SYNCED)} WHERE id = ? RETURNING cancel",
+                            (*values, job.id)).fetchone()
+        job.cancel_requested = job.cancel_requested or bool(row and row[0])
+
+    def run(self, job, fn, args):
+        self.sync(job)
+        if job.cancel_requested:
+            self.finish(job, CANCELLED)
+            return
+        job.state = RUNNING
+        self.sync(job)
+        try:
+            job.result = fn(job, *args)
+        except Cancelled:
+            self.finish(job, CANCELLED)
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+            self.finish(job, FAILED)
+        else:
+            job.progress = 1.0
+            self.finish(job, DONE)
+
+    def finish(self, job, state):
+        job.state, job.finished = state, time.time()
+        if state != DONE and job.file:
+            remove(job.file[0])
+        self.sync(job)
+
+    def get(self, job_id, owner):
+        with self.db.connection() as c:
+            row = c.execute("SELECT * FROM jobs WHERE id = ? AND owner = ?", (job_id, owner)).fetchone()
+        return Job.from_row(row) if row is not None else None
+
+    def cancel(self, job_id, owner):
+        with self.db.connection() as c:
+            c.execute(f"UPDATE jobs SET cancel = 1 WHERE id = ? AND owner = ? AND state NOT IN ({', '.join('?' * len(FINISHED))})",
+                      (job_id, owner, *FINISHED))
+        return self.get(job_id, owner)
+
+    def counts(self):
+        out = dict.fromkeys((QUEUED, RUNNING, DONE, FAILED, CANCELLED), 0)
+        with self.db.connection() as c:
+            for state, n in c.execute("SELECT state, count(*) FROM jobs GROUP BY state"):
+                out[state] += n
+        return out
+
+    def prune(self, c):
+        for row in c.execute("SELECT DISTINCT pid FROM jobs WHERE state IN (?, ?)", (QUEUED, RUNNING)).fetchall():
+            if not alive(row["pid"]):
+                c.execute("UPDATE jobs SET state = ?, error = ?, finished = ? WHERE pid = ? AND state IN (?, ?)",
+                          (FAILED, "The worker running this job exited.", time.time(), row["pid"], QUEUED, RUNNING))
+        rows = c.execute("DELETE FROM jobs WHERE finished < ? RETURNING file", (time.time() - self.keep,)).fetchall()
+        for row in rows:
+            if row["file"]:
+                remove(json.loads(row["file"])[0])
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
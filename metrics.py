@@ -0,0 +1,184 @@
+"""Minimal in-process metrics rendered in the Prometheus text format.
+
+Counters and histograms take label keyword arguments; each distinct label
+set gets its own series. Every worker process keeps its own numbers.
+"""
+from bisect import bisect_left
+import cProfile, os, random, re, threading, time, types
+
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def esc(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def fmt_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in labels) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name, self.help = name, help
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def inc(self, n=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + n
+
+    def samples(self):
+        with self.lock:
+            return [f"{self.name}{fmt_labels(k)} {v}" for k, v in sorted(self.series.items())]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.buckets = name, help, tuple(buckets)
+        self.series = {}    # labels -> [bucket counts..., +Inf count, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            s = self.series.get(key)
+            if s is None:
+                s = self.series[key] = [0] * (len(self.buckets) + 2)
+            s[i] += 1
+            s[-1] += value
+
+    def time(self, **labels):
+        return Timer(self, labels)
+
+    def samples(self):
+        out = []
+        with self.lock:
+            for key, s in sorted(self.series.items()):
+                total = 0
+                for bound, n in zip(self.buckets + ("+Inf",), s[:-1]):
+                    total += n
+                    out.append(f"{self.name}_bucket{fmt_labels(key + (('le', bound),))} {total}")
+                out.append(f"{self.name}_sum{fmt_labels(key)} {s[-1]}")
+                out.append(f"{self.name}_count{fmt_labels(key)} {total}")
+        return out
+
+
+class Timer:
+    __slots__ = ("hist", "labels", "t")
+
+    def __init__(self, hist, labels):
+        self.hist, self.labels = hist, labels
+
+    def __enter__(self):
+        self.t = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.t, **self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []    # callables returning extra exposition lines
+
+    def counter(self, name, help):
+        m = Counter(name, help)
+        self.metrics.append(m)
+        return m
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        m = Histogram(name, help, buckets)
+        self.metrics.append(m)
+        return m
+
+    def render(self):
+        lines = []
+        for m in self.metrics:
+            lines += [f"# HELP {m.name} {m.help}", f"# TYPE {m.name} {m.kind}", *m.samples()]
+        for collect in self.collectors:
+            lines += collect()
+        return "\n".join(lines) + "\n"
+
+
+def timed_iter(gen, hist, labels, spent):
+    """Yield from `gen`, timing only the time spent inside it; observes the
+    total (plus `spent`, the call itself) once it is exhausted or closed."""
+    try:
+        while True:
+            t = time.perf_counter()
+            try:
+                item = next(gen)
+            except StopIteration:
+                return
+            finally:
+                spent += time.perf_counter() - t
+            yield item
+    finally:
+        gen.close()
+        hist.observe(spent, **labels)
+
+
+class TimedStore:
+    """Wraps a store so every method call is observed in `hist` under op=<method>.
+
+    Generator methods (iter_cards and the like) do their work as the rows are
+    read, so those are observed when the caller finishes with the iterator.
+    """
+
+    def __init__(self, store, hist):
+        self._store, self._hist = store, hist
+
+    def __getattr__(self, name):
+        attr = getattr(self._store, name)
+        if not callable(attr):
+            return attr
+        hist = self._hist
+
+        def timed(*args, **kwargs):
+            t, result = time.perf_counter(), None
+            try:
+                result = attr(*args, **kwargs)
+            finally:
+                spent = time.perf_counter() - t
+                if not isinstance(result, types.GeneratorType):
+                    hist.observe(spent, op=name)
+            if isinstance(result, types.GeneratorType):
+                return timed_iter(result, hist, {"op": name}, spent)
+            return result
+        setattr(self, name, timed)      # later lookups skip __getattr__
+        return timed
+
+
+class SlowRequestProfiler:
+    """Profiles a random `sample` fraction of requests with cProfile and keeps
+    only those slower than `slow_ms`, as <directory>/<time>-<ms>-<endpoint>.prof."""
+
+    def __init__(self, directory, sample=0.1, slow_ms=200):
+        self.directory, self.sample, self.slow_ms = directory, sample, slow_ms
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        if random.random() >= self.sample:
+            return None
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:      # another request on this interpreter is being profiled
+            return None
+        return prof
+
+    def stop(self, prof, elapsed, endpoint):
+        prof.disable()
+        if elapsed * 1000 >= self.slow_ms:
+            name = re.sub(r"[^\w.-]", "_", endpoint or "unknown")
+            prof.dump_stats(os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{int(elapsed * 1000)}ms-{name}.prof"))
@@ -0,0 +1,48 @@
+"""Server-side review state (which card is up, whether its answer is shown).
+
+Keyed by an opaque per-browser session id, so the cookie stays the same
+small size however many decks a user studies. Entries live in one of the
+key-value backends of sessions.py, so every worker sees the same state:
+revealing an answer on one worker and grading on another works. An entry
+expires `ttl` seconds after its last use. The in-process backend holds at
+most `max_entries`; the shared ones drop expired entries on purge().
+"""
+import time
+
+from sessions import open_kv
+
+TTL = 6 * 3600
+MAX_ENTRIES = 100_000
+
+
+class ReviewStates:
+    def __init__(self, url=None, ttl=TTL, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.kv = open_kv(url, max_items=max_entries)
+
+    @staticmethod
+    def key(sid, deck_id):
+        return f"review:{sid}:{deck_id}"
+
+    def get(self, sid, deck_id):
+        """Return (card_id, reveal), or None if nothing live is stored."""
+        found = self.kv.get(self.key(sid, deck_id))
+        if found is None:
+            return None
+        value, expires = found
+        value = bytes(value).decode()
+        card_id, reveal = value[1:] or None, value[0] == "1"
+        # Touching the entry is a write on shared backends; do it only once
+        # half the TTL has gone, as sessions do.
+        if expires - time.time() < self.ttl / 2:
+            self.set(sid, deck_id, card_id, reveal)
+        return card_id, reveal
+
+    def set(self, sid, deck_id, card_id, reveal):
+        self.kv.set(self.key(sid, deck_id), f"{int(reveal)}{card_id or ''}".encode(), self.ttl)
+
+    def clear(self, sid, deck_id):
+        self.kv.delete(self.key(sid, deck_id))
+
+    def purge(self):
+        return self.kv.purge()
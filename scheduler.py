@@ -0,0 +1,174 @@
+"""SM-2 style spaced-repetition scheduling with a due-queue per user and deck.
+
+Each card carries (ease, interval, due, reps, last). A DeckQueue keeps a heap of
+(due, card_id) so the next card is found in O(log n); regrading pushes a
+fresh entry and the old one is skipped lazily when it reaches the top.
+"""
+from datetime import datetime
+import heapq, math, threading, time
+
+DAY = 86400
+RELEARN = 600        # seconds until a missed card comes back
+MIN_EASE = 1.3
+GRADES = {"correct": 4, "incorrect": 1}
+
+
+def sm2(ease, interval, reps, grade, now):
+    """Return the new (ease, interval, due, reps) for a card graded `grade` (SM-2 quality 0-5)."""
+    q = GRADES[grade]
+    ease = max(MIN_EASE, ease + 0.1 - (5 - q) * (0.08 + (5 - q) * 0.02))
+    if q < 3:
+        return ease, 0, now + RELEARN, 0
+    reps += 1
+    interval = 1 if reps == 1 else 6 if reps == 2 else round(interval * ease)
+    return ease, interval, now + interval * DAY, reps
+
+
+class DeckQueue:
+    __slots__ = ("heap", "state", "version")
+
+    def __init__(self, rows, version=None):
+        # card_id -> [ease, interval, due, reps, last]
+        self.state = {row[0]: list(row[1:]) for row in rows}
+        self.version = version    # the deck's sched_version the state reflects
+        self.heap = [(s[2], cid) for cid, s in self.state.items()]
+        heapq.heapify(self.heap)
+
+    def top(self, now):
+        """The card due first, or None if no card is due by `now`."""
+        heap, state = self.heap, self.state
+        while heap:
+            due, cid = heap[0]
+            s = state.get(cid)
+            if s is not None and s[2] == due:
+                return cid if due <= now else None
+            heapq.heappop(heap)
+        return None
+
+    def upcoming(self, n, now):
+        """Up to `n` card ids due by `now`, in due order, without popping anything."""
+        heap, state, out, seen = self.heap, self.state, [], set()
+        frontier = [(heap[0], 0)] if heap else []
+        while frontier and len(out) < n:
+            (due, cid), i = heapq.heappop(frontier)
+            if due > now:
+                break
+            s = state.get(cid)
+            if cid not in seen and s is not None and s[2] == due:
+                seen.add(cid)
+                out.append(cid)
+            for j in (2 * i + 1, 2 * i + 2):
+                if j < len(heap):
+                    heapq.heappush(frontier, (heap[j], j))
+        return out
+
+    def push(self, cid, ease, interval, due, reps, last):
+        self.state[cid] = [ease, interval, due, reps, last]
+        heapq.heappush(self.heap, (due, cid))
+        if len(self.heap) > 2 * len(self.state) + 64:
+            self.heap = [(s[2], c) for c, s in self.state.items()]
+            heapq.heapify(self.heap)
+
+    def due_count(self, now):
+        # Walk only the part of the heap that is due; children are never earlier than parents.
+        heap, state, n, todo = self.heap, self.state, 0, [0]
+        seen = set()
+        while todo:
+            i = todo.pop()
+            if i >= len(heap) or heap[i][0] > now:
+                continue
+            due, cid = heap[i]
+            if cid not in seen and state[cid][2] == due:
+                seen.add(cid)
+                n += 1
+            todo += (2 * i + 1, 2 * i + 2)
+        return n
+
+
+class Scheduler:
+    """Caches one DeckQueue per (email, deck_id), built from the store on first use
+    and rebuilt whenever the deck's sched_version shows a change this worker did not
+    make. Text edits leave sched_version alone, so they keep the queue."""
+
+    def __init__(self, store, events=None):
+        self.store = store
+        self.events = events      # an EventLog that gets every applied grade
+        self.queues = {}
+        self.lock = threading.Lock()
+
+    def queue(self, email, deck):
+        key = (email, deck["id"])
+        q = self.queues.get(key)
+        # Grades and new cards from another worker bump the deck's sched_version.
+        if q is None or q.version != deck["sched_version"]:
+            q = self.queues[key] = DeckQueue(self.store.schedules(email, deck["id"]), deck["sched_version"])
+        return q
+
+    def next_card(self, email, deck, now=None):
+        with self.lock:
+            return self.queue(email, deck).top(time.time() if now is None else now)
+
+    def due_count(self, email, deck, now=None):
+        with self.lock:
+            return self.queue(email, deck).due_count(time.time() if now is None else now)
+
+    def added(self, email, deck, cards):
+        """Push cards just saved by store.add_cards(email, deck, ...) onto the queue."""
+        with self.lock:
+            q = self.queues.get((email, deck["id"]))
+            if q is not None:
+                for card in cards:
+                    q.push(card["id"], card["ease"], card["interval"], card["due"], card["reps"], card["last"])
+                q.version = self.advanced(q.version, deck)
+
+    @staticmethod
+    def advanced(before, deck):
+        """The version a queue at `before` holds after one write of its own, or None to rebuild it.
+
+        add_cards and record_grades leave the deck's new sched_version in `deck`;
+        one step past `before` means no other write came in between.
+        """
+        if before is not None and deck["sched_version"] == before + 1:
+            return deck["sched_version"]
+        return None
+
+    def upcoming(self, email, deck, n, now=None):
+        with self.lock:
+            return self.queue(email, deck).upcoming(n, time.time() if now is None else now)
+
+    def grade(self, email, deck, card_id, grade, now=None):
+        return self.grade_many(email, deck, [(card_id, grade, time.time() if now is None else now)])
+
+    def grade_many(self, email, deck, grades):
+        """Apply [(card_id, grade, timestamp)] and return how many took effect.
+
+        Grades for unknown cards, with a timestamp that is not a finite time
+        after the card's last review, are skipped; that is what makes
+        resubmitting a batch safe. Timestamps from the future count as now.
+        The queue only takes the grades the store confirms.
+        """
+        applied, work, now = [], {}, time.time()
+        with self.lock:
+            q = self.queue(email, deck)
+            before = q.version
+            for card_id, grade, ts in sorted(grades, key=lambda g: g[2]):
+                s = work.get(card_id) or q.state.get(card_id)
+                if s is None or grade not in GRADES or not math.isfinite(ts):
+                    continue
+                ts = min(ts, now)
+                if ts <= s[4]:
+                    continue
+                new = work[card_id] = sm2(s[0], s[1], s[3], grade, ts) + (ts,)
+                applied.append((card_id, grade, datetime.fromtimestamp(ts).date().isoformat(), new))
+        if not applied:
+            return 0
+        done = self.store.record_grades(email, deck, applied)
+        scheds = {(card_id, sched[4]): sched for card_id, _, _, sched in applied}
+        with self.lock:
+            for card_id, _, ts in done:
+                q.push(card_id, *scheds[card_id, ts])
+            # If the store refused a grade the queue is rebuilt on next use.
+            q.version = self.advanced(before, deck) if len(done) == len(applied) else None
+        if done and self.events is not None:
+            self.events.append(email, deck["id"], done)
+        return len(done)
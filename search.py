@@ -0,0 +1,159 @@
+"""Inverted index over deck titles, descriptions, card text and #tags.
+
+One index per user: term -> Counter(deck_id -> weight), plus a sorted term
+list for prefix lookups. Every indexed document (a deck header or a card)
+remembers its own term weights, so edits subtract the old text exactly.
+
+An index is checked against the user's store version before each search. When
+that has moved (on this worker or another), decks whose text_version changed
+have just their added or edited cards re-read; a review bumps the version but
+not the text, so it costs one listing of the user's decks.
+
+Each index has its own lock, so building one user's index never holds up
+another user's search, and only the `max_users` most recently used are kept.
+"""
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict
+import re, threading
+
+TOKEN = re.compile(r"#?\w+")
+WEIGHTS = {"title": 8, "tag": 6, "desc": 3, "card": 1}
+EXACT_BONUS = 2       # exact term matches count double over prefix matches
+MAX_EXPAND = 64       # prefix terms considered per query term
+
+
+def terms(text, weight):
+    out = Counter()
+    for tok in TOKEN.findall(text.lower()):
+        if tok.startswith("#"):
+            out[tok] += WEIGHTS["tag"]
+            tok = tok[1:]
+        out[tok] += weight
+    return out
+
+
+class UserIndex:
+    __slots__ = ("postings", "vocab", "docs", "version", "seen", "lock")
+
+    def __init__(self):
+        self.postings = {}    # term -> Counter(deck_id -> weight)
+        self.vocab = []       # sorted terms
+        self.docs = {}        # (deck_id, card_id or None) -> Counter(term -> weight)
+        self.version = None   # store list_version the index is current with
+        self.seen = {}        # deck_id -> text_version indexed
+        self.lock = threading.Lock()
+
+    def put(self, deck_id, doc_id, tf):
+        old = self.docs.pop((deck_id, doc_id), None)
+        if old:
+            for t, w in old.items():
+                p = self.postings[t]
+                p[deck_id] -= w
+                if p[deck_id] <= 0:
+                    del p[deck_id]
+        for t, w in tf.items():
+            p = self.postings.get(t)
+            if p is None:
+                p = self.postings[t] = Counter()
+                insort(self.vocab, t)
+            p[deck_id] += w
+        self.docs[(deck_id, doc_id)] = tf
+
+    def expand(self, term):
+        i = bisect_left(self.vocab, term)
+        vocab, out = self.vocab, []
+        while i < len(vocab) and vocab[i].startswith(term) and len(out) < MAX_EXPAND:
+            out.append(vocab[i])
+            i += 1
+        return out
+
+    def search(self, query):
+        scores = None
+        for q in TOKEN.findall(query.lower()):
+            hits = Counter()
+            for t in self.expand(q):
+                bonus = EXACT_BONUS if t == q else 1
+                for deck_id, w in self.postings[t].items():
+                    hits[deck_id] += w * bonus
+            if scores is None:
+                scores = hits
+            else:
+                scores = Counter({d: s + hits[d] for d, s in scores.items() if d in hits})
+            if not scores:
+                return []
+        return [d for d, _ in scores.most_common()] if scores else []
+
+
+class SearchIndex:
+    """Built lazily per user from the store, then caught up from it on each search."""
+
+    def __init__(self, store, max_users=256):
+        self.store = store
+        self.max_users = max_users
+        self.users = OrderedDict()      # email -> UserIndex, least recently used first
+        self.warming = set()
+        self.lock = threading.Lock()    # guards users and warming; each index has its own
+
+    def warm(self, email):
+        """Build the user's index on a background thread if there is none yet,
+        so the first search does not wait for a full read of their cards."""
+        with self.lock:
+            if email in self.users or email in self.warming:
+                return
+            self.warming.add(email)
+        threading.Thread(target=self._warm, args=(email,), daemon=True).start()
+
+    def _warm(self, email):
+        try:
+            ix = self.user(email)
+            with ix.lock:
+                self.catch_up(email, ix)
+        finally:
+            with self.lock:
+                self.warming.discard(email)
+
+    def user(self, email):
+        with self.lock:
+            ix = self.users.get(email)
+            if ix is None:
+                ix = self.users[email] = UserIndex()
+                while len(self.users) > self.max_users:
+                    self.users.popitem(last=False)
+            else:
+                self.users.move_to_end(email)
+            return ix
+
+    def catch_up(self, email, ix):
+        """Bring `ix` up to date with the store; the caller holds ix.lock."""
+        # Read the version before the decks: a change made in between is then
+        # caught again on the next search.
+        version = self.store.list_version(email)
+        if ix.version == version:
+            return
+        for d in self.store.list_decks(email):
+            seen = ix.seen.get(d["id"])
+            if seen is None:
+                ix.put(d["id"], None, self.deck_terms(d))
+                seen = -1
+            if d["text_version"] != seen:
+                for c in self.store.edited_cards(email, d["id"], seen):
+                    ix.put(d["id"], c["id"], self.card_terms(c))
+                ix.seen[d["id"]] = d["text_version"]
+        ix.version = version
+
+    @staticmethod
+    def deck_terms(deck):
+        return terms(deck["title"], WEIGHTS["title"]) + terms(deck.get("desc") or "", WEIGHTS["desc"])
+
+    @staticmethod
+    def card_terms(card):
+        return terms(" ".join((card["front"], card["back"], card.get("hint") or "")), WEIGHTS["card"])
+
+    def search(self, email, decks, query):
+        """Return `decks` that match every term of `query`, best first."""
+        ix = self.user(email)
+        with ix.lock:
+            self.catch_up(email, ix)
+            ids = ix.search(query)
+        by_id = {d["id"]: d for d in decks}
+        return [by_id[i] for i in ids if i in by_id]
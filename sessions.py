@@ -0,0 +1,322 @@
+"""Server-side sessions and the cached user directory.
+
+The session cookie carries only a random id; the session itself (the
+logged-in user, pending flash messages) lives in a key-value backend that
+every worker process shares, so a login or a flash made by one worker is
+seen by the next request whichever worker serves it. The cookie is set once
+per session rather than re-signed whenever a flash is added or shown.
+
+Backends have the few operations of a key-value server (get, set with a
+TTL, delete, purge of expired keys):
+
+    MemoryKV    one process only; the default when nothing is configured
+    SQLiteKV    a table in a SQLite file, through a small connection pool
+    FileKV      one file per key in a directory, a local stand-in for a
+                key-value server such as Redis
+
+Session data is not cached in the worker: another worker may have changed
+it (a flash, a logout) since, and a primary-key read costs tens of
+microseconds. User records are, in Users, because they never change once
+created.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+import hashlib, os, queue, re, secrets, sqlite3, struct, tempfile, threading, time
+
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from werkzeug.datastructures import CallbackDict
+
+SID = re.compile(r"[A-Za-z0-9_-]{43}")     # secrets.token_urlsafe(32)
+EXPIRES = struct.Struct("<d")               # FileKV header
+POOL_SIZE = 8
+USER_CACHE_ITEMS = 10_000
+
+
+class MemoryKV:
+    """With `max_items`, the keys written longest ago are dropped past that many."""
+
+    def __init__(self, max_items=None):
+        self.data = OrderedDict()       # key -> (value, expires), oldest write first
+        self.max_items = max_items
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """(value, expires), or None if the key is missing or expired."""
+        entry = self.data.get(key)
+        return entry if entry is not None and entry[1] > time.time() else None
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.data[key] = (value, time.time() + ttl)
+            self.data.move_to_end(key)
+            while self.max_items is not None and len(self.data) > self.max_items:
+                self.data.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def purge(self):
+        """Drop expired keys; returns how many."""
+        now = time.time()
+        with self.lock:
+            dead = [k for k, (_, expires) in self.data.items() if expires <= now]
+            for k in dead:
+                del self.data[k]
+        return len(dead)
+
+
+class ConnectionPool:
+    """Up to `size` connections from `connect()`, handed out one per borrower."""
+
+    def __init__(self, connect, size=POOL_SIZE):
+        self.connect, self.size = connect, size
+        self.idle = queue.LifoQueue()
+        self.opened = 0
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        try:
+            c = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                grow = self.opened < self.size
+                if grow:
+                    self.opened += 1
+            if grow:
+                try:
+                    c = self.connect()
+                except BaseException:
+                    with self.lock:
+                        self.opened -= 1
+                    raise
+            else:
+                c = self.idle.get()     # wait for one to come back
+        try:
+            yield c
+        finally:
+            self.idle.put(c)
+
+
+class SQLiteKV:
+    def __init__(self, path, pool_size=POOL_SIZE):
+        self.path = path
+        self.pool = ConnectionPool(self.open, pool_size)
+        with self.pool.connection() as c:
+            c.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                      "expires REAL NOT NULL) WITHOUT ROWID")
+
+    def open(self):
+        c = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+        c.execute("PRAGMA journal_mode=WAL")
+        c.execute("PRAGMA synchronous=NORMAL")
+        return c
+
+    def get(self, key):
+        with self.pool.connection() as c:
+            return c.execute("SELECT value, expires FROM kv WHERE key = ? AND expires > ?",
+                             (key, time.time())).fetchone()
+
+    def set(self, key, value, ttl):
+        with self.pool.connection() as c:
+            c.execute("INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)",
+                      (key, value, time.time() + ttl))
+
+    def delete(self, key):
+        with self.pool.connection() as c:
+            c.execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def purge(self):
+        with self.pool.connection() as c:
+            return c.execute("DELETE FROM kv WHERE expires <= ?", (time.time(),)).rowcount
+
+
+class FileKV:
+    """Each key is a file `<directory>/<h[:2]>/<h>`, h a hash of the key,
+    holding its expiry time then its value. Writes go to a temporary file
+    that is renamed over the old one, so readers see whole values."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        h = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+        return os.path.join(self.directory, h[:2], h)
+
+    def get(self, key):
+        try:
+            with open(self.path(key), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        expires, = EXPIRES.unpack_from(data)
+        return (data[EXPIRES.size:], expires) if expires > time.time() else None
+
+    def set(self, key, value, ttl):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(EXPIRES.pack(time.time() + ttl) + value)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def purge(self):
+        now, n = time.time(), 0
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    if entry.name.startswith(".tmp-"):
+                        expired = entry.stat().st_mtime < now - 3600     # left by a crashed writer
+                    else:
+                        with open(entry.path, "rb") as f:
+                            expired = EXPIRES.unpack(f.read(EXPIRES.size))[0] <= now
+                    if expired:
+                        os.remove(entry.path)
+                        n += 1
+                except (FileNotFoundError, struct.error):
+                    pass
+        return n
+
+
+def open_kv(url=None, max_items=None):
+    """`None`/"memory", "file:<directory>", or a SQLite file path. `max_items`
+    caps the in-process backend; the others are bounded by TTLs and purge()."""
+    if not url or url == "memory":
+        return MemoryKV(max_items)
+    if url.startswith("file:"):
+        return FileKV(url.removeprefix("file:").removeprefix("//"))
+    return SQLiteKV(url.removeprefix("sqlite:///"))
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, expires=0.0):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid, self.expires = sid, expires
+        self.new = sid is None
+        self.modified = self.accessed = self.rotate = False
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+    def regenerate(self):
+        """Move the session to a fresh id when it is saved; call on login."""
+        self.rotate = self.modified = True
+
+
+class ServerSessionInterface(SessionInterface):
+    """Flask sessions kept in a key-value backend under the id in the cookie.
+
+    Sessions last app.permanent_session_lifetime past their last write; an
+    unchanged session is written back only once half of that has passed.
+    """
+
+    serializer = session_json_serializer
+
+    def __init__(self, kv):
+        self.kv = kv
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and SID.fullmatch(sid):
+            found = self.kv.get(sid)
+            if found is not None:
+                value, expires = found
+                try:
+                    return ServerSession(self.serializer.loads(bytes(value).decode()), sid, expires)
+                except ValueError:
+                    pass
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name, domain, path = self.get_cookie_name(app), self.get_cookie_domain(app), self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add("Cookie")
+        if not session:
+            if session.sid is not None:
+                self.kv.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+                response.vary.add("Cookie")
+            return
+        ttl = app.permanent_session_lifetime.total_seconds()
+        new = session.sid is None or session.rotate
+        if not new and not session.modified and session.expires - time.time() > ttl / 2:
+            return
+        if new:
+            if session.sid is not None:
+                self.kv.delete(session.sid)
+            session.sid, session.rotate = secrets.token_urlsafe(32), False
+        self.kv.set(session.sid, self.serializer.dumps(dict(session)).encode(), ttl)
+        if new or session.permanent:
+            response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                                secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+            response.vary.add("Cookie")
+
+
+class Users:
+    """Read-through LRU cache of the store's user records.
+
+    Accounts are never edited or removed, so a cached record is never stale;
+    misses are not cached, so an account another worker just created is found
+    on the next lookup.
+    """
+
+    def __init__(self, store, max_items=USER_CACHE_ITEMS):
+        self.store, self.max_items = store, max_items
+        self.data = OrderedDict()
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, email):
+        with self.lock:
+            user = self.data.get(email)
+            if user is not None:
+                self.data.move_to_end(email)
+                self.hits += 1
+                return user
+            self.misses += 1
+        user = self.store.get_user(email)
+        if user is not None:
+            self.remember(email, user)
+        return user
+
+    def add(self, email, password):
+        """Create the account; False if it already exists."""
+        if not self.store.add_user(email, password):
+            return False
+        self.remember(email, {"password": password})
+        return True
+
+    def remember(self, email, user):
+        with self.lock:
+            self.data[email] = user
+            self.data.move_to_end(email)
+            while len(self.data) > self.max_items:
+                self.data.popitem(last=False)
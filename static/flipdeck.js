@@ -0,0 +1,18 @@
+document.addEventListener('keydown', (e)=>{
+  const elShow = document.getElementById('btn-show');
+  const elC = document.getElementById('btn-correct');
+  const elI = document.getElementById('btn-incorrect');
+  if(!elShow && !elC && !elI) {
+    // no review hotkeys visible; keep going to check for Ctrl+Enter on forms
+  } else {
+    if (e.code === 'Space' && elShow) { e.preventDefault(); elShow.click(); }
+    if (e.key.toLowerCase() === 'c' && elC) { elC.click(); }
+    if (e.key.toLowerCase() === 'i' && elI) { elI.click(); }
+  }
+
+  // Ctrl/Cmd + Enter submits the first form that opts in
+  if ((e.ctrlKey || e.metaKey) && e.key === 'Enter') {
+    const form = document.querySelector('form[data-ctrl-enter="true"]');
+    if (form) { e.preventDefault(); form.requestSubmit(); }
+  }
+});
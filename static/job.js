@@ -0,0 +1,21 @@
+// Polls the job's JSON status until it finishes, then reloads the page for
+// the final messages and download link.
+(function(){
+  const box = document.getElementById('job');
+  if (!window.fetch || !box) return;
+  const FINISHED = ['done', 'failed', 'cancelled'];
+  if (FINISHED.includes(document.getElementById('job-state').textContent)) return;
+
+  async function poll(){
+    try {
+      const r = await fetch(box.dataset.poll);
+      const job = await r.json();
+      document.getElementById('job-progress').value = job.progress;
+      document.getElementById('job-state').textContent = job.state;
+      document.getElementById('job-summary').textContent = job.error || job.summary;
+      if (FINISHED.includes(job.state)) { location.reload(); return; }
+    } catch (e) {}
+    setTimeout(poll, 1000);
+  }
+  setTimeout(poll, 500);
+})();
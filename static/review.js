@@ -0,0 +1,77 @@
+// With JS the review runs off the JSON API: cards are prefetched, answers
+// revealed locally and grades sent in batches. The page's plain forms are the fallback.
+(function(){
+  const box = document.getElementById('review');
+  if (!window.fetch || !box) return;
+  const queue = [], pending = [], held = new Set();
+  const PREFETCH = 20, LOW_WATER = 3, BATCH = 10;
+  let cur = null, flushing = null;   // the grades POST in flight, if any
+
+  function el(tag, cls, text){ const e = document.createElement(tag); if (cls) e.className = cls; if (text) e.textContent = text; return e; }
+  function button(id, cls, text, fn){ const b = el('button', cls, text); b.id = id; b.type = 'button'; b.onclick = fn; return b; }
+
+  // One POST at a time: a caller waits for the one in flight, then sends what is left,
+  // so /next is never asked for before the grades it must leave out are stored.
+  async function flush(){
+    while (flushing) await flushing;
+    if (!pending.length) return;
+    flushing = send(pending.splice(0)).finally(() => { flushing = null; });
+    return flushing;
+  }
+
+  async function send(batch){
+    try {
+      const r = await fetch(box.dataset.grades, {method: 'POST', headers: {'Content-Type': 'application/json'},
+                                                 body: JSON.stringify({grades: batch})});
+      // Keep the grades for the next flush (or the pagehide beacon) unless they were taken.
+      if (!r.ok) { pending.unshift(...batch); return; }
+      const data = await r.json();
+      document.getElementById('due-count').textContent = data.due;
+      batch.forEach(g => held.delete(g.card));
+    } catch (e) { pending.unshift(...batch); }
+  }
+
+  async function load(){
+    await flush();
+    const r = await fetch(box.dataset.next + '?n=' + PREFETCH);
+    const data = await r.json();
+    document.getElementById('due-count').textContent = data.due;
+    data.cards.forEach(c => { if (!held.has(c.id)) { held.add(c.id); queue.push(c); } });
+  }
+
+  function render(reveal){
+    box.replaceChildren();
+    if (!cur) { box.append(el('p', 'hint', 'No cards left to review.')); return; }
+    if (!reveal) {
+      box.append(el('h3', '', cur.front));
+      const row = el('div', 'row'); row.style.marginTop = '10px';
+      row.append(button('btn-show', 'btn', 'Show Answer', () => render(true)), el('span', 'hint', 'Press Space'));
+      box.append(row);
+      return;
+    }
+    const card = el('div', 'card');
+    card.append(el('div', 'hint', 'Prompt'), el('div', '', cur.front), el('div', 'hint', 'Answer'), el('div', '', cur.back));
+    if (cur.hint) card.append(el('div', 'hint', 'Hint: ' + cur.hint));
+    const row = el('div', 'row'); row.style.marginTop = '10px';
+    row.append(button('btn-correct', 'btn', 'Correct (C)', () => grade('correct')),
+               button('btn-incorrect', 'btn secondary', 'Incorrect (I)', () => grade('incorrect')));
+    box.append(card, row);
+  }
+
+  async function next(){
+    if (queue.length < LOW_WATER) await load();
+    cur = queue.shift() || null;
+    render(false);
+  }
+
+  function grade(g){
+    pending.push({card: cur.id, grade: g, timestamp: Date.now() / 1000});
+    if (pending.length >= BATCH) flush();
+    next();
+  }
+
+  window.addEventListener('pagehide', () => {
+    if (pending.length) navigator.sendBeacon(box.dataset.grades, JSON.stringify({grades: pending.splice(0)}));
+  });
+  next();
+})();
@@ -0,0 +1,573 @@
+"""Storage backends for FlipDeck users, decks, cards and stats.
+
+MemoryStore keeps everything in process dicts (tests, local dev).
+SQLiteStore persists to a WAL-mode database so several worker processes on
+one host can share the same data.
+"""
+from array import array
+from bisect import bisect_right
+from collections import defaultdict, Counter
+import sqlite3, threading, time, uuid
+
+
+def new_id(n=8): return uuid.uuid4().hex[:n]
+
+# by_deck is keyed by deck id so renamed decks keep their history.
+def new_stats(): return {"streak": 0, "last_day": None, "by_deck": Counter()}
+
+def new_card(front, back, hint, ease=2.5, interval=0, due=None, reps=0, last=0):
+    # New cards are due immediately, oldest first; restored ones keep their schedule.
+    # Card ids are longer than deck ids: a 50k-card deck would collide on 8 hex digits.
+    return {"id": new_id(16), "front": front, "back": back, "hint": hint, "ease": ease, "interval": interval,
+            "due": time.time() if due is None else due, "reps": reps, "last": last}
+
+
+class Card:
+    """A card as MemoryStore hands it out: attributes for templates, item access
+    like the dicts SQLiteStore returns. It is a copy; changes go through the store."""
+    __slots__ = ("id", "pos", "front", "back", "hint", "ease", "interval", "due", "reps", "last")
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+
+class CardTable:
+    """One deck's cards as parallel columns, indexed by position.
+
+    Texts sit in lists, schedules in typed arrays, and hints are codes into a
+    per-deck string table, so a repeated hint is stored once. Compared with a
+    dict per card this drops the per-card key table and boxed floats.
+    """
+
+    def __init__(self):
+        self.ids, self.fronts, self.backs = [], [], []
+        self.hints = array("I")                 # codes into hint_table
+        self.hint_table, self.hint_codes = [], {}
+        self.ease, self.interval, self.due, self.last = array("d"), array("d"), array("d"), array("d")
+        self.reps = array("i")
+        self.edited = array("I")                # deck text_version when the text last changed
+        # (versions, positions) of every add and text edit, oldest first; a card
+        # edited twice appears twice and only its last entry counts.
+        self.edits = (array("I"), array("I"))
+        self.index = {}                         # card id -> pos
+
+    def __len__(self):
+        return len(self.ids)
+
+    def hint_code(self, hint):
+        code = self.hint_codes.get(hint)
+        if code is None:
+            code = self.hint_codes[hint] = len(self.hint_table)
+            self.hint_table.append(hint)
+        return code
+
+    def add(self, card, edited=0):
+        """Append a new_card() dict; returns it as a Card."""
+        pos = len(self.ids)
+        self.fronts.append(card["front"])
+        self.backs.append(card["back"])
+        self.hints.append(self.hint_code(card["hint"]))
+        self.ease.append(card["ease"])
+        self.interval.append(card["interval"])
+        self.due.append(card["due"])
+        self.reps.append(card["reps"])
+        self.last.append(card["last"])
+        self.edited.append(edited)
+        # The id goes last: len() counts ids, so readers on other threads never
+        # see a position whose columns are not filled in yet.
+        self.ids.append(card["id"])
+        self.index[card["id"]] = pos
+        self.log_edit(pos, edited)
+        return self.card(pos)
+
+    def card(self, pos):
+        return Card(self.ids[pos], pos, self.fronts[pos], self.backs[pos], self.hint_table[self.hints[pos]],
+                    self.ease[pos], self.interval[pos], self.due[pos], self.reps[pos], self.last[pos])
+
+    def set_text(self, pos, front, back, hint, edited):
+        self.fronts[pos], self.backs[pos], self.hints[pos] = front, back, self.hint_code(hint)
+        self.edited[pos] = edited
+        self.log_edit(pos, edited)
+
+    def log_edit(self, pos, edited):
+        versions, positions = self.edits
+        if len(positions) > 2 * len(self.edited) + 64:
+            # Mostly superseded entries: keep one per card, in edit order.
+            order = sorted(range(len(self.edited)), key=self.edited.__getitem__)
+            self.edits = (array("I", (self.edited[p] for p in order)), array("I", order))
+        else:
+            positions.append(pos)
+            versions.append(edited)
+
+    def edited_since(self, since):
+        """Positions whose text changed after text_version `since`, in edit order."""
+        versions, positions = self.edits
+        edited = self.edited
+        for i in range(bisect_right(versions, since), len(versions)):
+            pos = positions[i]
+            if edited[pos] == versions[i]:
+                yield pos
+
+    def set_schedule(self, pos, ease, interval, due, reps, last):
+        self.ease[pos], self.interval[pos], self.due[pos], self.reps[pos], self.last[pos] = \
+            ease, interval, due, reps, last
+
+    def schedules(self):
+        return list(zip(self.ids, self.ease, self.interval, self.due, self.reps, self.last))
+
+
+class MemoryStore:
+    """Writes (from request threads and import jobs alike) go one at a time, so
+    card positions and the version counters stay whole. Reads take no lock,
+    except edited_cards, which walks the edit log the writes append to."""
+
+    def __init__(self):
+        self.users = {}
+        # email -> {deck_id: deck}; dicts keep insertion order for the listing page.
+        # Each deck keeps its cards in a CardTable under "cards".
+        self.decks = defaultdict(dict)
+        self.stats = defaultdict(new_stats)
+        self.daily = defaultdict(dict)          # email -> {day: [correct, incorrect]}
+        self.card_totals = defaultdict(dict)    # deck_id -> {card_id: [correct, incorrect, last]}
+        self.versions = Counter()               # email -> deck list version
+        self.lock = threading.Lock()
+
+    def get_user(self, email):
+        return self.users.get(email)
+
+    def add_user(self, email, password):
+        with self.lock:
+            if email in self.users:
+                return False
+            self.users[email] = {"password": password}
+            return True
+
+    def list_decks(self, email):
+        return list(self.decks[email].values())
+
+    def get_deck(self, email, deck_id):
+        return self.decks[email].get(deck_id)
+
+    def add_deck(self, email, title, desc):
+        d = {"id": new_id(), "title": title, "desc": desc, "n_cards": 0, "version": 0, "text_version": 0,
+             "sched_version": 0, "cards": CardTable()}
+        with self.lock:
+            self.decks[email][d["id"]] = d
+            self.versions[email] += 1
+        return d
+
+    def list_version(self, email):
+        return self.versions[email]
+
+    def bump_versions(self, email, deck):
+        # Anything a deck page, the deck list or the stats page shows has changed.
+        deck["version"] += 1
+        self.versions[email] += 1
+
+    def list_cards(self, email, deck_id):
+        return list(self.iter_cards(email, deck_id))
+
+    def iter_cards(self, email, deck_id, after=-1, limit=None):
+        """Cards with pos > `after` in position order, at most `limit` of them."""
+        deck = self.get_deck(email, deck_id)
+        if not deck:
+            return
+        table = deck["cards"]
+        stop = len(table) if limit is None else min(len(table), after + 1 + limit)
+        for pos in range(max(after + 1, 0), stop):
+            yield table.card(pos)
+
+    def edited_cards(self, email, deck_id, since):
+        """Cards added or edited after the deck's text_version was `since`."""
+        deck = self.get_deck(email, deck_id)
+        if not deck:
+            return
+        table = deck["cards"]
+        with self.lock:
+            positions = list(table.edited_since(since))
+        for pos in positions:
+            yield table.card(pos)
+
+    def get_card(self, email, deck_id, card_id):
+        deck = self.get_deck(email, deck_id)
+        pos = deck["cards"].index.get(card_id) if deck else None
+        return None if pos is None else deck["cards"].card(pos)
+
+    def schedules(self, email, deck_id):
+        return self.get_deck(email, deck_id)["cards"].schedules()
+
+    def add_card(self, email, deck, front, back, hint):
+        return self.add_cards(email, deck, [(front, back, hint)])[0]
+
+    def add_cards(self, email, deck, rows):
+        """`deck` is the stored deck, so its versions are bumped in place."""
+        with self.lock:
+            deck["text_version"] += 1
+            cards = [deck["cards"].add(new_card(*row), deck["text_version"]) for row in rows]
+            deck["n_cards"] += len(cards)
+            deck["sched_version"] += 1
+            self.bump_versions(email, deck)
+        return cards
+
+    def update_card(self, email, deck_id, card_id, front, back, hint):
+        deck = self.get_deck(email, deck_id)
+        with self.lock:
+            deck["text_version"] += 1
+            deck["cards"].set_text(deck["cards"].index[card_id], front, back, hint, deck["text_version"])
+            self.bump_versions(email, deck)
+
+    def get_cards(self, email, deck_id, card_ids):
+        deck = self.get_deck(email, deck_id)
+        if not deck:
+            return {}
+        table = deck["cards"]
+        return {cid: table.card(table.index[cid]) for cid in card_ids if cid in table.index}
+
+    def get_stats(self, email):
+        return self.stats[email]
+
+    def day_totals(self, email, start, end):
+        """[(day, correct, incorrect)] for days with reviews in [start, end], oldest first."""
+        return sorted((day, *n) for day, n in self.daily[email].items() if start <= day <= end)
+
+    def restore_stats(self, email, streak, last_day, daily, by_deck):
+        """Merge stats from an account backup: day and deck counts add up, and the
+        streak is taken from the backup if its last review day is newer."""
+        with self.lock:
+            s = self.stats[email]
+            if last_day and (s["last_day"] is None or last_day > s["last_day"]):
+                s["streak"], s["last_day"] = streak, last_day
+            for day, ok, bad in daily:
+                n = self.daily[email].setdefault(day, [0, 0])
+                n[0] += ok
+                n[1] += bad
+            s["by_deck"].update(by_deck)
+            self.versions[email] += 1
+
+    def get_card_totals(self, deck_id):
+        return {cid: tuple(v) for cid, v in self.card_totals[deck_id].items()}
+
+    def record_grades(self, email, deck, grades):
+        """Apply [(card_id, action, day, (ease, interval, due, reps, last))].
+
+        A grade no newer than the card's last review is skipped, so replaying a
+        batch is harmless. Returns the applied grades as (card_id, action, ts);
+        `deck` is the stored deck, so its versions are bumped in place.
+        """
+        with self.lock:
+            s, applied, table = self.stats[email], [], deck["cards"]
+            for card_id, action, day, sched in grades:
+                pos = table.index.get(card_id)
+                if pos is None or sched[4] <= table.last[pos]:
+                    continue
+                table.set_schedule(pos, *sched)
+                if s["last_day"] is None or day > s["last_day"]:
+                    s["streak"] = s["streak"] + 1 if s["last_day"] is not None else 1
+                    s["last_day"] = day
+                self.daily[email].setdefault(day, [0, 0])[0 if action == "correct" else 1] += 1
+                s["by_deck"][deck["id"]] += 1
+                t = self.card_totals[deck["id"]].setdefault(card_id, [0, 0, 0])
+                t[0 if action == "correct" else 1] += 1
+                t[2] = max(t[2], sched[4])
+                applied.append((card_id, action, sched[4]))
+            if applied:
+                deck["sched_version"] += 1
+                self.bump_versions(email, deck)
+        return applied
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+  email TEXT PRIMARY KEY,
+  password TEXT NOT NULL,
+  version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS decks (
+  seq INTEGER PRIMARY KEY,
+  email TEXT NOT NULL,
+  deck_id TEXT NOT NULL UNIQUE,
+  title TEXT NOT NULL,
+  "desc" TEXT NOT NULL DEFAULT '',
+  n_cards INTEGER NOT NULL DEFAULT 0,
+  version INTEGER NOT NULL DEFAULT 0,
+  text_version INTEGER NOT NULL DEFAULT 0,
+  sched_version INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS decks_user_deck ON decks (email, deck_id);
+CREATE TABLE IF NOT EXISTS cards (
+  seq INTEGER PRIMARY KEY,
+  deck_id TEXT NOT NULL,
+  card_id TEXT NOT NULL,
+  pos INTEGER NOT NULL,
+  front TEXT NOT NULL,
+  back TEXT NOT NULL,
+  hint TEXT NOT NULL DEFAULT '',
+  ease REAL NOT NULL DEFAULT 2.5,
+  interval REAL NOT NULL DEFAULT 0,
+  due REAL NOT NULL DEFAULT 0,
+  reps INTEGER NOT NULL DEFAULT 0,
+  last REAL NOT NULL DEFAULT 0,
+  edited INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS cards_deck_card ON cards (deck_id, card_id);
+CREATE UNIQUE INDEX IF NOT EXISTS cards_deck_pos ON cards (deck_id, pos);
+CREATE INDEX IF NOT EXISTS cards_deck_edited ON cards (deck_id, edited);
+CREATE TABLE IF NOT EXISTS stats (
+  email TEXT PRIMARY KEY,
+  streak INTEGER NOT NULL DEFAULT 0,
+  last_day TEXT
+);
+CREATE TABLE IF NOT EXISTS daily (
+  email TEXT NOT NULL,
+  day TEXT NOT NULL,
+  correct INTEGER NOT NULL DEFAULT 0,
+  incorrect INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (email, day)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS deck_totals (
+  email TEXT NOT NULL,
+  deck_id TEXT NOT NULL,
+  n INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (email, deck_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS card_totals (
+  deck_id TEXT NOT NULL,
+  card_id TEXT NOT NULL,
+  correct INTEGER NOT NULL DEFAULT 0,
+  incorrect INTEGER NOT NULL DEFAULT 0,
+  last REAL NOT NULL DEFAULT 0,
+  PRIMARY KEY (deck_id, card_id)
+) WITHOUT ROWID;
+"""
+
+DECK_COLS = 'deck_id AS id, title, "desc", n_cards, version, text_version, sched_version'
+CARD_COLS = "card_id AS id, pos, front, back, hint, ease, interval, due, reps, last"
+
+
+class SQLiteStore:
+    """One connection per thread; sqlite3 caches each statement per connection."""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        with self.conn() as c:
+            c.executescript(SCHEMA)
+
+    def conn(self):
+        c = getattr(self.local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(self.path, timeout=10, cached_statements=256, check_same_thread=False)
+            c.row_factory = sqlite3.Row
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = c
+        return c
+
+    def one(self, sql, args):
+        row = self.conn().execute(sql, args).fetchone()
+        return dict(row) if row else None
+
+    def get_user(self, email):
+        return self.one("SELECT password FROM users WHERE email = ?", (email,))
+
+    def add_user(self, email, password):
+        try:
+            with self.conn() as c:
+                c.execute("INSERT INTO users (email, password) VALUES (?, ?)", (email, password))
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def list_decks(self, email):
+        rows = self.conn().execute(f"SELECT {DECK_COLS} FROM decks WHERE email = ? ORDER BY seq", (email,))
+        return [dict(r) for r in rows]
+
+    def get_deck(self, email, deck_id):
+        return self.one(f"SELECT {DECK_COLS} FROM decks WHERE email = ? AND deck_id = ?", (email, deck_id))
+
+    def add_deck(self, email, title, desc):
+        while True:
+            d = {"id": new_id(), "title": title, "desc": desc, "n_cards": 0, "version": 0, "text_version": 0,
+                 "sched_version": 0}
+            try:
+                with self.conn() as c:
+                    c.execute('INSERT INTO decks (email, deck_id, title, "desc") VALUES (?, ?, ?, ?)',
+                              (email, d["id"], title, desc))
+                    c.execute("UPDATE users SET version = version + 1 WHERE email = ?", (email,))
+                return d
+            except sqlite3.IntegrityError:
+                continue
+
+    def list_version(self, email):
+        row = self.one("SELECT version FROM users WHERE email = ?", (email,))
+        return row["version"] if row else 0
+
+    @staticmethod
+    def bump_versions(c, email, deck_id):
+        """Mark a deck changed; returns its new version."""
+        # Anything a deck page, the deck list or the stats page shows has changed.
+        c.execute("UPDATE users SET version = version + 1 WHERE email = ?", (email,))
+        return c.execute("UPDATE decks SET version = version + 1 WHERE deck_id = ? RETURNING version",
+                         (deck_id,)).fetchone()[0]
+
+    def list_cards(self, email, deck_id):
+        return list(self.iter_cards(email, deck_id))
+
+    def iter_cards(self, email, deck_id, after=-1, limit=None):
+        """Cards with pos > `after` in position order, at most `limit` of them."""
+        if not self.get_deck(email, deck_id):
+            return
+        cur = self.conn().execute(f"SELECT {CARD_COLS} FROM cards WHERE deck_id = ? AND pos > ? ORDER BY pos LIMIT ?",
+                                  (deck_id, after, -1 if limit is None else limit))
+        for row in cur:
+            yield dict(row)
+
+    def edited_cards(self, email, deck_id, since):
+        """Cards added or edited after the deck's text_version was `since`."""
+        if not self.get_deck(email, deck_id):
+            return
+        for row in self.conn().execute(f"SELECT {CARD_COLS} FROM cards WHERE deck_id = ? AND edited > ?",
+                                       (deck_id, since)):
+            yield dict(row)
+
+    def get_card(self, email, deck_id, card_id):
+        if not self.get_deck(email, deck_id):
+            return None
+        return self.one(f"SELECT {CARD_COLS} FROM cards WHERE deck_id = ? AND card_id = ?", (deck_id, card_id))
+
+    def schedules(self, email, deck_id):
+        return self.conn().execute("SELECT card_id, ease, interval, due, reps, last FROM cards WHERE deck_id = ?",
+                                   (deck_id,)).fetchall()
+
+    def add_card(self, email, deck, front, back, hint):
+        return self.add_cards(email, deck, [(front, back, hint)])[0]
+
+    def add_cards(self, email, deck, rows):
+        """Insert the cards at the end of the deck; leaves the deck's new versions in `deck`."""
+        cards, deck_id = [new_card(*row) for row in rows], deck["id"]
+        with self.conn() as c:
+            # Bumping n_cards first takes the write lock, so the positions are stable.
+            row = c.execute("UPDATE decks SET n_cards = n_cards + ?, version = version + 1, "
+                            "text_version = text_version + 1, sched_version = sched_version + 1 WHERE deck_id = ? "
+                            "RETURNING n_cards, version, text_version, sched_version", (len(cards), deck_id)).fetchone()
+            deck["n_cards"], deck["version"], deck["text_version"], deck["sched_version"] = row
+            base, edited = row[0] - len(cards), row[2]
+            c.execute("UPDATE users SET version = version + 1 WHERE email = ?", (email,))
+            for i, card in enumerate(cards):
+                card["pos"] = base + i
+            c.executemany("INSERT INTO cards (deck_id, card_id, pos, front, back, hint, ease, interval, due, reps, last, "
+                          "edited) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                          [(deck_id, card["id"], card["pos"], card["front"], card["back"], card["hint"], card["ease"],
+                            card["interval"], card["due"], card["reps"], card["last"], edited) for card in cards])
+        return cards
+
+    def update_card(self, email, deck_id, card_id, front, back, hint):
+        with self.conn() as c:
+            edited, = c.execute("UPDATE decks SET text_version = text_version + 1 WHERE deck_id = ? "
+                                "RETURNING text_version", (deck_id,)).fetchone()
+            c.execute("UPDATE cards SET front = ?, back = ?, hint = ?, edited = ? WHERE deck_id = ? AND card_id = ?",
+                      (front, back, hint, edited, deck_id, card_id))
+            self.bump_versions(c, email, deck_id)
+
+    def get_cards(self, email, deck_id, card_ids):
+        if not card_ids or not self.get_deck(email, deck_id):
+            return {}
+        marks = ",".join("?" * len(card_ids))
+        rows = self.conn().execute(f"SELECT {CARD_COLS} FROM cards WHERE deck_id = ? AND card_id IN ({marks})",
+                                   (deck_id, *card_ids))
+        return {r["id"]: dict(r) for r in rows}
+
+    def get_stats(self, email):
+        s = new_stats()
+        row = self.one("SELECT streak, last_day FROM stats WHERE email = ?", (email,))
+        if row:
+            s.update(row)
+        for r in self.conn().execute("SELECT deck_id, n FROM deck_totals WHERE email = ?", (email,)):
+            s["by_deck"][r["deck_id"]] = r["n"]
+        return s
+
+    def day_totals(self, email, start, end):
+        """[(day, correct, incorrect)] for days with reviews in [start, end], oldest first."""
+        return [tuple(r) for r in self.conn().execute(
+            "SELECT day, correct, incorrect FROM daily WHERE email = ? AND day BETWEEN ? AND ? ORDER BY day",
+            (email, start, end))]
+
+    def restore_stats(self, email, streak, last_day, daily, by_deck):
+        """Merge stats from an account backup: day and deck counts add up, and the
+        streak is taken from the backup if its last review day is newer."""
+        with self.conn() as c:
+            if last_day:
+                c.execute("INSERT INTO stats (email, streak, last_day) VALUES (?, ?, ?) "
+                          "ON CONFLICT (email) DO UPDATE SET "
+                          "streak = CASE WHEN last_day IS NULL OR excluded.last_day > last_day "
+                          "THEN excluded.streak ELSE streak END, "
+                          "last_day = CASE WHEN last_day IS NULL OR excluded.last_day > last_day "
+                          "THEN excluded.last_day ELSE last_day END", (email, streak, last_day))
+            c.executemany("INSERT INTO daily (email, day, correct, incorrect) VALUES (?, ?, ?, ?) "
+                          "ON CONFLICT (email, day) DO UPDATE SET "
+                          "correct = correct + excluded.correct, incorrect = incorrect + excluded.incorrect",
+                          [(email, day, ok, bad) for day, ok, bad in daily])
+            c.executemany("INSERT INTO deck_totals (email, deck_id, n) VALUES (?, ?, ?) "
+                          "ON CONFLICT (email, deck_id) DO UPDATE SET n = n + excluded.n",
+                          [(email, deck_id, n) for deck_id, n in by_deck.items()])
+            c.execute("UPDATE users SET version = version + 1 WHERE email = ?", (email,))
+
+    def get_card_totals(self, deck_id):
+        rows = self.conn().execute("SELECT card_id, correct, incorrect, last FROM card_totals WHERE deck_id = ?",
+                                   (deck_id,))
+        return {r[0]: tuple(r[1:]) for r in rows}
+
+    def record_grades(self, email, deck, grades):
+        """Apply [(card_id, action, day, (ease, interval, due, reps, last))] in one transaction.
+
+        The `last < ?` guard makes replays (and grades another worker already
+        applied) no-ops. Returns the applied grades as (card_id, action, ts),
+        and leaves the deck's new versions in `deck`.
+        """
+        applied = []
+        with self.conn() as c:
+            for card_id, action, day, sched in grades:
+                cur = c.execute("UPDATE cards SET ease = ?, interval = ?, due = ?, reps = ?, last = ? "
+                                "WHERE deck_id = ? AND card_id = ? AND last < ?",
+                                (*sched, deck["id"], card_id, sched[4]))
+                if not cur.rowcount:
+                    continue
+                c.execute("INSERT INTO stats (email, streak, last_day) VALUES (?, 1, ?) "
+                          "ON CONFLICT (email) DO UPDATE SET "
+                          "streak = CASE WHEN excluded.last_day > last_day THEN streak + 1 ELSE streak END, "
+                          "last_day = max(last_day, excluded.last_day)", (email, day))
+                ok = int(action == "correct")
+                c.execute("INSERT INTO daily (email, day, correct, incorrect) VALUES (?, ?, ?, ?) "
+                          "ON CONFLICT (email, day) DO UPDATE SET "
+                          "correct = correct + excluded.correct, incorrect = incorrect + excluded.incorrect",
+                          (email, day, ok, 1 - ok))
+                c.execute("INSERT INTO deck_totals (email, deck_id, n) VALUES (?, ?, 1) "
+                          "ON CONFLICT (email, deck_id) DO UPDATE SET n = n + 1", (email, deck["id"]))
+                c.execute("INSERT INTO card_totals (deck_id, card_id, correct, incorrect, last) VALUES (?, ?, ?, ?, ?) "
+                          "ON CONFLICT (deck_id, card_id) DO UPDATE SET correct = correct + excluded.correct, "
+                          "incorrect = incorrect + excluded.incorrect, last = max(last, excluded.last)",
+                          (deck["id"], card_id, ok, 1 - ok, sched[4]))
+                applied.append((card_id, action, sched[4]))
+            if applied:
+                c.execute("UPDATE users SET version = version + 1 WHERE email = ?", (email,))
+                deck["version"], deck["sched_version"] = c.execute(
+                    "UPDATE decks SET version = version + 1, sched_version = sched_version + 1 WHERE deck_id = ? "
+                    "RETURNING version, sched_version", (deck["id"],)).fetchone()
+        return applied
+
+
+def open_store(url=None):
+    """`None`/"memory" for in-process dicts, otherwise a SQLite file path."""
+    if not url or url == "memory":
+        return MemoryStore()
+    return SQLiteStore(url.removeprefix("sqlite:///"))